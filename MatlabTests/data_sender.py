@@ -1,44 +1,268 @@
-import socket
-import struct
+"""data_sender
 
-# Testing script; not in use
+Stands in for the ACT4D Simulink model: sends made up packets to the
+EMonitor at a steady rate, to load the receive and render paths at and
+beyond the real rate without the lab hardware.
+
+The produced torque and force follow a sine, a ramp or steps around their
+targets. Every --state-period seconds the state (v2 only) steps through 0,
+1 and 2, a sound cue is triggered for the first 100 ms of the step (so each
+step raises one trigger edge) and the stop trigger is sent for its last
+50 ms. Packets carry the sequence number and a time.perf_counter()
+timestamp unless --no-timing is given, so the EMonitor can count drops and
+measure its latency on this machine.
+
+Packets can also be lost, duplicated, sent with the wrong length, or held
+back and sent in bursts, at random (seeded by --seed). Send times are
+paced by time.perf_counter, sleeping until shortly before each packet is
+due and spinning for the rest; a packet that is late is sent at once, and
+the lateness is reported at the end.
+
+Run from the repository root, e.g.:
+    python MatlabTests/data_sender.py --version 2 --rate 5000 --seconds 10
+    python MatlabTests/data_sender.py --rate 1000 --loss 0.01 --burst 50
+"""
+
+import argparse, math, os, random, socket, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from emonitor.protocol import LEGACY_SOUNDS, PacketDecoder, schema
 
 # UDP_IP = "192.168.37.1"
-UDP_IP = "165.124.9.239"
+# UDP_IP = "165.124.9.239"
+UDP_IP = "127.0.0.1"
 PORT = 5005
 
+# The targets and limits, as the original test packet had them
+TORQUE = (5, 4, 6)
+FORCE = (7, 6, 8)
+
+# Sleep until this long before a packet is due, then spin
+SPIN_TIME = 0.002
+
+
+def trajectory(shape, t, period):
+    # Goes between -1 and 1, period seconds a cycle
+    phase = (t / period) % 1.0
+
+    if shape == "sine":
+        return math.sin(2 * math.pi * phase)
+    if shape == "ramp":
+        return 2 * phase - 1
+    if shape == "step":
+        return -1.0 if phase < 0.5 else 1.0
+
+    raise ValueError(f"Unknown trajectory {shape!r}")
+
+
+def packet_values(t, version, n_sounds, shape, period, state_period):
+    # The values of the packet sent t seconds into the run, in Schema order
+    target_tor, low_tor, up_tor = TORQUE
+    targetF, lowF, upF = FORCE
+
+    # Torque between its limits, force a quarter cycle behind
+    match_tor = target_tor + (up_tor - target_tor) * trajectory(shape, t, period)
+    matchF = targetF + (upF - targetF) * trajectory(shape, t - period / 4, period)
+
+    doubles = [target_tor, low_tor, up_tor, match_tor, targetF, lowF, upF, matchF]
+
+    step = int(t // state_period)
+    into_step = t - step * state_period
+
+    if version == 2:
+        doubles.append(step % 3)
+
+    triggers = [False] * n_sounds
+    if into_step < 0.1:
+        triggers[step % n_sounds] = True
+
+    stop = 1 if into_step >= state_period - 0.05 else 0
+
+    return (*doubles, *triggers, stop)
+
+
+def wait_until(due):
+    # Sleeps, then spins, until due on the perf_counter clock, and returns
+    # how late it is
+    now = time.perf_counter()
+
+    if due - now > SPIN_TIME:
+        time.sleep(due - now - SPIN_TIME)
+
+    while True:
+        now = time.perf_counter()
+        if now >= due:
+            return now - due
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Send made up ACT4D packets to the EMonitor"
+    )
+    parser.add_argument("--ip", default=UDP_IP)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument(
+        "--version", type=int, default=2, choices=(1, 2), help="packet layout"
+    )
+    parser.add_argument(
+        "--described",
+        action="store_true",
+        help="send packets with a header (see emonitor/protocol.py)",
+    )
+    parser.add_argument("--sounds", type=int, default=LEGACY_SOUNDS)
+    parser.add_argument(
+        "--rate", type=float, default=1000, help="packets/s, e.g. 100 to 20000"
+    )
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument(
+        "--no-timing",
+        action="store_true",
+        help="leave out the sequence number and timestamp",
+    )
+    parser.add_argument(
+        "--trajectory", choices=("sine", "ramp", "step"), default="sine"
+    )
+    parser.add_argument(
+        "--period", type=float, default=2.0, help="seconds per trajectory cycle"
+    )
+    parser.add_argument(
+        "--state-period", type=float, default=2.0, help="seconds per state"
+    )
+    parser.add_argument(
+        "--loss", type=float, default=0.0, help="fraction of packets not sent"
+    )
+    parser.add_argument(
+        "--duplicate",
+        type=float,
+        default=0.0,
+        help="fraction of packets sent twice",
+    )
+    parser.add_argument(
+        "--malformed",
+        type=float,
+        default=0.0,
+        help="fraction of packets followed by one of the wrong length",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=0,
+        help="hold back this many packets at a time and send them together",
+    )
+    parser.add_argument(
+        "--burst-every",
+        type=float,
+        default=1.0,
+        help="seconds between bursts (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not 0 < args.rate <= 100000:
+        parser.error("--rate must be between 0 and 100000 packets/s")
+
+    timed = not args.no_timing
+    described = args.described or args.sounds != LEGACY_SOUNDS
+    layout = schema(args.version, args.sounds, timed, described)
+    header = layout.header() if described else b""
+    pack = layout.struct.pack
+
+    print(f"Sending {layout} to {args.ip}:{args.port} at {args.rate:g}/s")
+
+    # Wrong lengths are never ones the EMonitor would take for another layout,
+    # e.g. a described packet cut to its untimed size
+    decoder = PacketDecoder(args.sounds)
+    extra = (0, 0.0) if timed else ()
+    values = packet_values(0, args.version, args.sounds, "sine", 1.0, 1.0)
+    sample = header + pack(*values, *extra)
+    wrong_lengths = [
+        n
+        for n in range(1, layout.size + 2)
+        if decoder.decode((sample + b"\x00")[:n]) is None
+    ]
+
+    rng = random.Random(args.seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = (args.ip, args.port)
+
+    n_packets = int(args.seconds * args.rate)
+    burst_interval = max(int(args.burst_every * args.rate), 1)
+
+    sent = lost = duplicated = malformed = bursts = 0
+    total_lateness = max_lateness = 0.0
+    held = []
+
+    start = time.perf_counter()
+
+    for sequence in range(n_packets):
+        t = sequence / args.rate
+        values = packet_values(
+            t,
+            args.version,
+            args.sounds,
+            args.trajectory,
+            args.period,
+            args.state_period,
+        )
+
+        # Pacing comes first, so packets that are lost still take their time
+        lateness = wait_until(start + t)
+        total_lateness += lateness
+        max_lateness = max(max_lateness, lateness)
+
+        if timed:
+            packet = header + pack(*values, sequence, time.perf_counter())
+        else:
+            packet = header + pack(*values)
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # A lost packet still goes through the burst below, so the last one
+        # of a burst window sends what was held back even when it is lost
+        if rng.random() < args.loss:
+            lost += 1
+            out = []
 
-target_tor = 5
-low_tor = 4
-up_tor = 6
-match_tor = 5.5
+        else:
+            out = [packet]
 
-targetF = 7
-lowF = 6
-upF = 8
-matchF = 6.45
+            if rng.random() < args.duplicate:
+                out.append(packet)
+                duplicated += 1
 
-sound_trigger = [False for i in range(13)]
+            if rng.random() < args.malformed:
+                # Cut short, or with a byte too many
+                out.append((packet + b"\x00")[: rng.choice(wrong_lengths)])
+                malformed += 1
 
-stop_trigger = False
+        # A burst holds back the packets of its window, like a sender that
+        # stalls and then catches up
+        if args.burst and sequence % burst_interval < args.burst:
+            held.extend(out)
+            if sequence % burst_interval < args.burst - 1:
+                continue
 
-buf = bytes()
+            out, held = held, []
+            bursts += 1
 
-buf += struct.pack('<d', target_tor)
-buf += struct.pack('<d', low_tor)
-buf += struct.pack('<d', up_tor)
-buf += struct.pack('<d', match_tor)
+        for data in out:
+            sock.sendto(data, address)
+            sent += 1
 
-buf += struct.pack('<d', targetF)
-buf += struct.pack('<d', lowF)
-buf += struct.pack('<d', upF)
-buf += struct.pack('<d', matchF)
+    for data in held:
+        sock.sendto(data, address)
+        sent += 1
 
-for i in sound_trigger:
-    buf += struct.pack('<?', i)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Sent {sent} packets in {elapsed:.2f} s ({sent / elapsed:.0f}/s): "
+        f"{lost} lost, {duplicated} duplicated, {malformed} malformed, "
+        f"{bursts} bursts"
+    )
+    print(
+        f"Pacing: {total_lateness / max(n_packets, 1) * 1e6:.1f} us late on "
+        f"average, {max_lateness * 1e3:.2f} ms at most"
+    )
 
-buf += struct.pack('<?', stop_trigger)
 
-sock.sendto(buf, (UDP_IP, PORT))
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""bench_processes
+
+Compares how steady the EMonitor window's frames are with everything in one
+process and with the network side split into its own (split_processes, see
+emonitor.processes), each with and without a synthetic background load: a
+thread doing pure Python work that holds the GIL, standing in for recording
+or an online analysis. The load runs next to the receiving, so in the window's
+process when there is one, and in the network process when split.
+
+Packets are sent to the window by another process at --rate. For each run
+the interval between frames is printed, its standard deviation being the
+jitter the load adds. The load can only be taken off the window's core if
+there is another one, so on a single core machine splitting only takes away
+the GIL contention.
+
+Run from the repository root:
+    python benchmarks/bench_processes.py --seconds 5
+"""
+
+import argparse, multiprocessing, os, socket, sys, threading, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import pyglet
+
+
+def send(port, rate, seconds):
+    # Sends a synthetic v1 session to port, paced by the monotonic clock
+    from emonitor.replay import synthetic_packets
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    start = time.perf_counter()
+
+    for t, data in synthetic_packets(1, seconds, rate):
+        wait = start + t - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        sock.sendto(data, ("127.0.0.1", port))
+
+
+def busy(stop):
+    # Pure Python work, which holds the GIL for a switch interval at a time
+    while not stop.is_set():
+        sum(i * i for i in range(10000))
+
+
+def start_load():
+    stop = threading.Event()
+    threading.Thread(target=busy, args=(stop,), daemon=True).start()
+    return stop
+
+
+def serve_with_load(*args, **kwargs):
+    # The network process, with the load running beside the receiving
+    from emonitor.processes import serve
+
+    stop = start_load()
+    try:
+        serve(*args, **kwargs)
+    finally:
+        stop.set()
+
+
+def run(split, load, args, results):
+    # Runs in a fresh process, so no run sees what an earlier one left behind
+    if args.headless:
+        pyglet.options["headless"] = True
+
+    from emonitor.app import EMonitorApp
+    from emonitor.processes import NetworkProcess, serve
+
+    NetworkProcess.target = staticmethod(serve_with_load if load else serve)
+
+    app = EMonitorApp(
+        version=1,
+        ip="127.0.0.1",
+        port=args.port,
+        screen_index=0,
+        split_processes=split,
+        track_latency=False,
+        fullscreen=False,
+        vsync=False,
+    )
+
+    frame_times = []
+
+    def on_draw():
+        frame_times.append(time.perf_counter())
+
+    app.window.push_handlers(on_draw=on_draw)
+
+    sender = multiprocessing.Process(
+        target=send, args=(args.port, args.rate, args.seconds + 1)
+    )
+
+    app.start()
+    sender.start()
+
+    load_stop = start_load() if load and not split else None
+
+    # The first second is left out, while everything warms up
+    pyglet.clock.schedule_once(lambda dt: frame_times.clear(), 1)
+    pyglet.clock.schedule_once(lambda dt: pyglet.app.exit(), args.seconds + 1)
+    pyglet.app.run()
+
+    if load_stop is not None:
+        load_stop.set()
+
+    sender.join()
+    app.stop()
+
+    results.put(np.diff(frame_times))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare frame jitter with and without split processes"
+    )
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rate", type=float, default=1000, help="packets/s")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="use an EGL context, for machines without a display",
+    )
+    args = parser.parse_args()
+
+    spawn = multiprocessing.get_context("spawn")
+    queue = spawn.Queue()
+
+    results = []
+    for split in (False, True):
+        for load in (False, True):
+            process = spawn.Process(target=run, args=(split, load, args, queue))
+            process.start()
+            results.append((split, load, queue.get()))
+            process.join()
+
+    print()
+    print(f"{os.cpu_count()} CPUs, {args.rate:g} packets/s, {args.seconds:g} s each")
+
+    for split, load, intervals in results:
+        label = ("split" if split else "one process") + (", loaded" if load else "")
+        ms = intervals * 1000
+
+        print(
+            f"{label:<20} {len(ms)} frames, interval mean {ms.mean():.2f} ms "
+            f"sd {ms.std():.2f} ms p99 {np.percentile(ms, 99):.2f} ms "
+            f"max {ms.max():.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
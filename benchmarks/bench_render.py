@@ -0,0 +1,192 @@
+"""bench_render
+
+Times the EMonitor draw paths (draw_normal_protocol, draw_photos and
+draw_blank_window) rendering into an offscreen window, while scripted
+sequences of target/limit/match values are fed to an EMonitor. Reports the
+p50/p99/max frame time and the memory allocated per frame for each path.
+
+Each frame does what on_draw does: clear the window, draw the FPS display,
+update and draw the scene, then glFinish so the GL work is counted too.
+Software GL is fine, so this runs on a Linux box with no GPU:
+    python benchmarks/bench_render.py --headless
+"""
+
+import argparse, math, os, random, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pyglet
+
+
+def steady(frame, m):
+    # Nothing changes, every frame after the first should be cheap
+    pass
+
+
+def slow_ramp(frame, m):
+    # The produced torque and force drift around their targets
+    m.match_tor = m.target_tor * (1 + 0.5 * math.sin(frame / 60))
+    m.matchF = m.targetF * (1 + 0.5 * math.sin(frame / 90))
+
+
+def fast_radii(frame, m):
+    # Every radius jumps each frame, anywhere from 0 to about 2 x HEIGHT
+    m.match_tor = m.target_tor * random.uniform(0, 3)
+    m.low_lim_tor = m.target_tor * random.uniform(0.2, 1)
+    m.up_lim_tor = m.target_tor * random.uniform(1, 3)
+    m.matchF = m.targetF * random.uniform(0, 2)
+
+
+SEQUENCES = {
+    "steady": steady,
+    "slow_ramp": slow_ramp,
+    "fast_radii": fast_radii,
+}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def load_photos(directory, limit, width, height):
+    # Decoded to fit the window up front, like the EMonitor's PhotoLibrary
+    from emonitor.photos import decode_photo, photo_paths
+
+    photos = [
+        decode_photo(path, width, height).get_texture()
+        for path in photo_paths(directory)[:limit]
+    ]
+
+    if not photos:
+        pattern = pyglet.image.SolidColorImagePattern((128, 128, 128, 255))
+        photos.append(pattern.create_image(800, 600))
+
+    return photos
+
+
+def run_path(window, fps_display, scene, m, sequence, frames, trace):
+    """
+    Draws frames frames of one path, and returns a list of
+    (seconds, allocated bytes) per frame
+    """
+    from pyglet import gl
+
+    results = []
+
+    for frame in range(frames):
+        sequence(frame, m)
+
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+
+        window.clear()
+        fps_display.draw()
+        scene.update(m)
+        scene.draw()
+        gl.glFinish()
+
+        elapsed = time.perf_counter() - start
+
+        allocated = 0
+        if trace:
+            allocated = tracemalloc.get_traced_memory()[1] - before
+
+        results.append((elapsed, allocated))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the EMonitor draw paths offscreen"
+    )
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument(
+        "--sequence",
+        choices=list(SEQUENCES),
+        action="append",
+        help="sequences to feed the normal protocol (default: all)",
+    )
+    parser.add_argument("--photos", default="images", help="directory of photos")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="use an EGL context, for machines without a display",
+    )
+    args = parser.parse_args()
+
+    if args.headless:
+        pyglet.options["headless"] = True
+
+    from emonitor.monitor import EMonitor
+    from emonitor.scene import BlankScene, NormalProtocolScene, PhotoScene, WHITE
+
+    random.seed(0)
+
+    window = pyglet.window.Window(args.width, args.height, visible=False)
+    fps_display = pyglet.window.FPSDisplay(window=window)
+    pyglet.gl.glClearColor(*WHITE, 255)
+
+    m = EMonitor(port=None, version=2)
+    m.target_tor, m.low_lim_tor, m.up_lim_tor, m.match_tor = 5, 4, 6, 5.5
+    m.targetF, m.low_limF, m.up_limF, m.matchF = 7, 6, 8, 6.45
+
+    m.graphics = load_photos(args.photos, 8, window.width, window.height)
+
+    def next_photo(frame, m):
+        # A new photo every second, like a new state 0 period
+        if frame % 60 == 0:
+            m.last_image = m.graphics[(frame // 60) % len(m.graphics)]
+
+    paths = []
+    for name in args.sequence or list(SEQUENCES):
+        paths.append(
+            (
+                f"draw_normal_protocol/{name}",
+                NormalProtocolScene(window.width, window.height, 3, WHITE),
+                SEQUENCES[name],
+            )
+        )
+    paths.append(("draw_photos", PhotoScene(window.width, window.height), next_photo))
+    paths.append(("draw_blank_window", BlankScene(), steady))
+
+    print(
+        f"{args.frames} frames at {window.width}x{window.height}, "
+        f"{pyglet.gl.gl_info.get_renderer()}"
+    )
+    print(
+        f"{'path':36s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} "
+        f"{'KiB/frame':>10s}"
+    )
+
+    for name, scene, sequence in paths:
+        # Timed without tracemalloc, since it slows every allocation down
+        random.seed(0)
+        timings = run_path(window, fps_display, scene, m, sequence, args.frames, False)
+
+        random.seed(0)
+        tracemalloc.start()
+        allocations = run_path(
+            window, fps_display, scene, m, sequence, args.frames, True
+        )
+        tracemalloc.stop()
+
+        times = [t * 1000 for t, _ in timings]
+        allocated = [a / 1024 for _, a in allocations]
+
+        print(
+            f"{name:36s} {percentile(times, 50):8.3f} {percentile(times, 99):8.3f} "
+            f"{max(times):8.3f} {percentile(allocated, 50):10.1f}"
+        )
+
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""bench_ring
+
+Compares the cached NumPy ring rasterizer in emonitor.ring with the original
+pure Python mid-point version, across the radii the monitor draws (0 to about
+2 x HEIGHT). Also checks that both place exactly the same pixels.
+
+Run from the repository root:
+    python benchmarks/bench_ring.py --height 1080
+"""
+
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pyglet
+
+
+def legacy_custom_draw_circle_one_thick(x_center, y_center, radius, color, batch):
+    # The original implementation, kept here as the reference
+
+    X = radius
+    Y = 0
+
+    points = []
+
+    points.append([X + x_center, y_center])
+    points.append([x_center + X, y_center])
+    points.append([x_center - X, y_center])
+
+    points.append([x_center, y_center + X])
+    points.append([x_center, y_center - X])
+
+    if radius > 0:
+        points.append([X + x_center, -Y + y_center])
+        points.append([Y + x_center, X + y_center])
+        points.append([-Y + x_center, X + y_center])
+
+    P = 1 - radius
+
+    while X > Y:
+        Y += 1
+
+        # Midpoint is inside or on the perimeter
+        if P <= 0:
+            P = P + 2 * Y + 1
+
+        else:
+            X -= 1
+            P = P + 2 * Y - 2 * X + 1
+
+        if X < Y:
+            break
+
+        points.append([X + x_center, Y + y_center])
+        points.append([-X + x_center, Y + y_center])
+        points.append([X + x_center, -Y + y_center])
+        points.append([-X + x_center, -Y + y_center])
+
+        if X != Y:
+            points.append([Y + x_center, X + y_center])
+            points.append([-Y + x_center, X + y_center])
+            points.append([Y + x_center, -X + y_center])
+            points.append([-Y + x_center, -X + y_center])
+
+    num_points = len(points)
+    # Concatanate points list; gl expects list in format [x0, y0, x1, y1...]
+    collapsed_points = [j for i in points for j in i]
+
+    color_list = color * num_points
+
+    batch.add(
+        num_points,
+        pyglet.gl.GL_POINTS,
+        None,
+        ("v2i", collapsed_points),
+        ("c3B", color_list),
+    )
+
+
+def legacy_custom_draw_circle(x_center, y_center, radius, color, thickness, batch):
+    edges = min(thickness, radius)
+
+    for t in range(edges):
+        rad = radius - t
+
+        legacy_custom_draw_circle_one_thick(x_center, y_center, rad, color, batch)
+
+
+class PointCollector:
+    """Stands in for a batch, and records the points added to it"""
+
+    def __init__(self):
+        self.points = set()
+
+    def add(self, count, mode, group, vertices, colors):
+        v = vertices[1]
+        self.points.update(zip(v[0::2], v[1::2]))
+
+
+def check(radii, thickness):
+    from emonitor.ring import ring_offsets
+
+    mismatches = []
+    for radius in radii:
+        collector = PointCollector()
+        legacy_custom_draw_circle(0, 0, radius, (255, 0, 0), thickness, collector)
+
+        points = set(map(tuple, ring_offsets(radius, thickness).tolist()))
+
+        if points != collector.points:
+            mismatches.append(radius)
+
+    return mismatches
+
+
+def time_per_call(function, radii, repeat, warm=False):
+    """
+    Returns the mean seconds per call over all radii
+
+    With warm set, each radius is drawn once before it is timed, so the
+    time is what a repeated radius costs
+    """
+    total = 0
+    for radius in radii:
+        if warm:
+            function(radius)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function(radius)
+        total += time.perf_counter() - start
+
+    return total / (repeat * len(radii))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the NumPy ring rasterizer with the original one"
+    )
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--thickness", type=int, default=3)
+    parser.add_argument("--step", type=int, default=10, help="radius step")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="use an EGL context, for machines without a display",
+    )
+    args = parser.parse_args()
+
+    if args.headless:
+        pyglet.options["headless"] = True
+
+    from emonitor import ring
+
+    # A hidden window is only needed for its GL context
+    window = pyglet.window.Window(width=64, height=64, visible=False)
+
+    radii = list(range(0, 2 * args.height + 1, args.step))
+    thickness = args.thickness
+    cx = args.height // 2
+    cy = args.height // 2
+    color = (255, 0, 0)
+
+    mismatches = check(radii, thickness)
+    if mismatches:
+        print(f"Pixel mismatch at radii {mismatches[:10]}")
+    else:
+        print(f"Pixels match for {len(radii)} radii")
+
+    def legacy(radius):
+        batch = pyglet.graphics.Batch()
+        legacy_custom_draw_circle(cx, cy, radius, color, thickness, batch)
+
+    def uncached(radius):
+        ring.ring_offsets.cache_clear()
+        batch = pyglet.graphics.Batch()
+        ring.custom_draw_circle(cx, cy, radius, color, thickness, batch)
+
+    def cached(radius):
+        batch = pyglet.graphics.Batch()
+        ring.custom_draw_circle(cx, cy, radius, color, thickness, batch)
+
+    batch = pyglet.graphics.Batch()
+    moving = ring.Ring(cx, cy, color, thickness, batch)
+
+    def in_place(radius):
+        # Step away and back, like the torque moving around a value
+        moving.radius = radius + 1
+        moving.radius = radius
+
+    results = [
+        ("legacy custom_draw_circle", time_per_call(legacy, radii, args.repeat)),
+        ("numpy, cold cache", time_per_call(uncached, radii, args.repeat)),
+        ("numpy, warm cache", time_per_call(cached, radii, args.repeat, True)),
+        ("Ring.radius, warm cache", time_per_call(in_place, radii, args.repeat, True)),
+    ]
+
+    print(f"Radii 0-{radii[-1]} step {args.step}, thickness {thickness}")
+    base = results[0][1]
+    for name, seconds in results:
+        print(f"{name:28s} {seconds * 1e6:10.1f} us/call  {base / seconds:7.1f}x")
+
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
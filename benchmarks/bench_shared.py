@@ -0,0 +1,142 @@
+"""bench_shared
+
+Times publishing samples to shared memory (emonitor.shared) with 0 to 8
+reader processes following them, either polling (sleeping between reads)
+or spinning. The writer publishes at --rate samples a second, like an
+EMonitor receiving packets, and its time per publish and CPU use are
+compared with no readers; each reader's share of the samples, and any it
+dropped, are printed too. On a machine with few cores spinning readers
+compete with the writer for CPU, which is what the numbers show there.
+
+Run from the repository root:
+    python benchmarks/bench_shared.py --rate 1000 --seconds 2
+"""
+
+import argparse, multiprocessing, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+
+from emonitor.history import SAMPLE_DTYPE
+from emonitor.shared import SharedStatePublisher, SharedStateReader
+
+NAME = "emonitor_bench"
+
+
+def reader(name, spin, poll_interval, stop, results):
+    r = SharedStateReader(name)
+    rows = 0
+    reads = 0
+
+    while not stop.is_set():
+        rows += len(r.read_new())
+        reads += 1
+
+        if not spin:
+            time.sleep(poll_interval)
+
+    rows += len(r.read_new())
+    results.put((rows, r.dropped, reads))
+    r.close()
+
+
+def run(n_readers, spin, args):
+    publisher = SharedStatePublisher(NAME, args.capacity)
+
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=reader, args=(NAME, spin, args.poll_interval, stop, results)
+        )
+        for _ in range(n_readers)
+    ]
+    for p in processes:
+        p.start()
+
+    # Give the readers time to attach before anything is published
+    time.sleep(0.5)
+
+    row = np.zeros((), dtype=SAMPLE_DTYPE)
+    n = int(args.rate * args.seconds)
+    period = 1 / args.rate
+    publish_times = np.empty(n)
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    for i in range(n):
+        # Paced like packets arriving, by sleeping until each one is due
+        due = start + i * period
+        wait = due - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+
+        row["receive_time"] = time.perf_counter()
+        t = time.perf_counter()
+        publisher.publish(row)
+        publish_times[i] = time.perf_counter() - t
+
+    cpu = time.process_time() - cpu_start
+    elapsed = time.perf_counter() - start
+
+    # Let the readers catch up before stopping them
+    time.sleep(0.1)
+    stop.set()
+    read = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+
+    publisher.close()
+
+    return n, publish_times, cpu / elapsed, read
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time publishing samples to shared memory with readers"
+    )
+    parser.add_argument("--rate", type=float, default=1000, help="samples/s")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--capacity", type=int, default=4096)
+    parser.add_argument(
+        "--readers", type=int, nargs="+", default=[0, 1, 4, 8], help="reader counts"
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=0.001,
+        help="seconds a polling reader sleeps between reads",
+    )
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.rate:g} samples/s for {args.seconds:g} s")
+
+    for n_readers in args.readers:
+        for spin in (False, True) if n_readers else (False,):
+            n, times, cpu, read = run(n_readers, spin, args)
+
+            mode = "spinning" if spin else "polling"
+            label = f"{n_readers} readers, {mode}" if n_readers else "no readers"
+
+            line = (
+                f"{label:<22} publish p50 {np.percentile(times, 50) * 1e6:.2f} us "
+                f"p99 {np.percentile(times, 99) * 1e6:.2f} us, "
+                f"writer CPU {cpu * 100:.1f}%"
+            )
+
+            if read:
+                rows = sum(r[0] for r in read) / len(read)
+                dropped = sum(r[1] for r in read)
+                reads = sum(r[2] for r in read) / len(read)
+                line += (
+                    f", each reader got {rows / n * 100:.1f}% in {reads:.0f} reads"
+                    f" ({dropped} dropped)"
+                )
+
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
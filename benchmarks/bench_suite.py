@@ -0,0 +1,386 @@
+"""bench_suite
+
+Micro-benchmarks of the EMonitor's hot functions, to compare between
+commits:
+    unpack/*   EMonitor.unpack_udp_package, per packet, for each layout
+    drain/*    EMonitor.recieve_single_udp emptying a local socket with a
+               backlog of packets waiting, per packet
+    ring/*     emonitor.ring.custom_draw_circle across the radii and
+               thicknesses shown, and moving a Ring in place, per ring
+    scene/*    building a NormalProtocolScene, which replaced draw_circle
+               and draw_full_line, and updating it with new values
+    sound/*    SoundEngine.on_packet, the sound trigger scan, per packet
+    stats/*    StreamStats.add, per packet
+
+Every benchmark runs once to warm up and then --repeat times, with the
+garbage collector off, and its min, median and spread per operation are
+written to a JSON file. Give an earlier file to --compare to see what
+changed:
+    python benchmarks/bench_suite.py --headless --output before.json
+    python benchmarks/bench_suite.py --headless --compare before.json
+"""
+
+import argparse, gc, json, os, platform, random, socket, statistics, subprocess
+import sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pyglet
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers a benchmark. The decorated function sets it up and returns a
+    function that runs it once and returns (operations, seconds)
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def timed_calls(function, arguments):
+    # Calls function with each tuple of arguments, and returns
+    # (calls, seconds)
+    start = time.perf_counter()
+    for args in arguments:
+        function(*args)
+    return len(arguments), time.perf_counter() - start
+
+
+def values_packet(version, timed=False, described=False, sequence=0):
+    # The bytes of one packet with the test values, and a cue triggered
+    from emonitor.protocol import schema
+
+    layout = schema(version, timed=timed, described=described)
+    doubles = [5, 4, 6, 5.5, 7, 6, 8, 6.45] + [1] * (version == 2)
+    triggers = [False] * layout.n_sounds
+    triggers[1] = True
+    extra = (sequence, time.perf_counter()) if timed else ()
+
+    header = layout.header() if described else b""
+    return header + layout.struct.pack(*doubles, *triggers, 0, *extra)
+
+
+def unpack(version, timed=False, described=False):
+    def setup(args, cleanup):
+        from emonitor.monitor import EMonitor
+
+        m = EMonitor(port=None, version=version)
+        packets = [
+            (values_packet(version, timed, described, i), 0.0) for i in range(1000)
+        ]
+
+        def run():
+            return timed_calls(m.unpack_udp_package, packets)
+
+        return run
+
+    return setup
+
+
+benchmark("unpack/v1")(unpack(1))
+benchmark("unpack/v2")(unpack(2))
+benchmark("unpack/v2_timed")(unpack(2, timed=True))
+benchmark("unpack/v2_described")(unpack(2, described=True))
+
+
+def drain(backlog):
+    def setup(args, cleanup):
+        from emonitor.monitor import EMonitor
+
+        # Any free port; the buffer holds the whole backlog
+        m = EMonitor("127.0.0.1", 0, version=2, rcvbuf=1 << 22)
+        address = m.sock.getsockname()
+
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        cleanup.append(sender.close)
+        cleanup.append(m.sock.close)
+
+        packet = values_packet(2)
+
+        def run():
+            for _ in range(backlog):
+                sender.sendto(packet, address)
+
+            count = m.history.count
+            start = time.perf_counter()
+            m.recieve_single_udp(0)
+            seconds = time.perf_counter() - start
+
+            # Anything the kernel dropped would make this look faster
+            received = m.history.count - count
+            if received != backlog:
+                raise RuntimeError(f"Drained {received} of {backlog} packets")
+
+            return received, seconds
+
+        return run
+
+    return setup
+
+
+benchmark("drain/backlog_100")(drain(100))
+benchmark("drain/backlog_1000")(drain(1000))
+
+
+def rings(thickness):
+    def setup(args, cleanup):
+        from emonitor.ring import custom_draw_circle
+
+        radii = [(r,) for r in range(0, 2 * args.height + 1, 20)]
+        center = args.height // 2
+
+        def run():
+            batch = pyglet.graphics.Batch()
+            return timed_calls(
+                lambda r: custom_draw_circle(
+                    center, center, r, (255, 0, 0), thickness, batch
+                ),
+                radii,
+            )
+
+        return run
+
+    return setup
+
+
+for thickness in (1, 3, 5):
+    benchmark(f"ring/custom_draw_circle_t{thickness}")(rings(thickness))
+
+
+@benchmark("ring/move_t3")
+def move_ring(args, cleanup):
+    from emonitor.ring import Ring
+
+    batch = pyglet.graphics.Batch()
+    ring = Ring(args.height // 2, args.height // 2, (255, 0, 0), 3, batch)
+    radii = [(r,) for r in range(0, 2 * args.height + 1, 20)]
+
+    def move(radius):
+        ring.radius = radius
+
+    def run():
+        return timed_calls(move, radii)
+
+    return run
+
+
+@benchmark("scene/construct")
+def construct_scene(args, cleanup):
+    from emonitor.scene import NormalProtocolScene
+
+    def run():
+        start = time.perf_counter()
+        for _ in range(5):
+            NormalProtocolScene(args.width, args.height, 3)
+        return 5, time.perf_counter() - start
+
+    return run
+
+
+@benchmark("scene/update")
+def update_scene(args, cleanup):
+    from emonitor.monitor import EMonitor
+    from emonitor.scene import NormalProtocolScene
+
+    m = EMonitor(port=None, version=2)
+    scene = NormalProtocolScene(args.width, args.height, 3)
+
+    # Every radius and line moves each update, as in bench_render's
+    # fast_radii
+    rng = random.Random(0)
+    values = [
+        (rng.uniform(0, 15), rng.uniform(1, 5), rng.uniform(5, 15), rng.uniform(0, 14))
+        for _ in range(200)
+    ]
+
+    def update(match_tor, low_lim_tor, up_lim_tor, matchF):
+        m.match_tor, m.low_lim_tor, m.up_lim_tor, m.matchF = (
+            match_tor,
+            low_lim_tor,
+            up_lim_tor,
+            matchF,
+        )
+        scene.update(m)
+
+    def run():
+        return timed_calls(update, values)
+
+    return run
+
+
+class SilentPlayer:
+    def play(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def sound_scan(edge_every):
+    def setup(args, cleanup):
+        from emonitor.sound import SoundEngine
+
+        engine = SoundEngine([SilentPlayer() for _ in range(13)], threaded=False)
+
+        # The triggers as decoded: a new tuple for every packet
+        packets = []
+        for i in range(1000):
+            triggers = [False] * 13
+            if edge_every and (i // edge_every) % 2:
+                triggers[(i // edge_every) % 13] = True
+            packets.append((0.0, tuple(triggers), 0))
+
+        def run():
+            return timed_calls(engine.on_packet, packets)
+
+        return run
+
+    return setup
+
+
+benchmark("sound/on_packet_steady")(sound_scan(0))
+benchmark("sound/on_packet_edges")(sound_scan(10))
+
+
+@benchmark("stats/add")
+def stats_add(args, cleanup):
+    from emonitor.stats import StreamStats
+
+    stats = StreamStats()
+    packets = [(i * 0.001, i) for i in range(1000)]
+
+    def run():
+        # Carries on from the last run's times and sequence numbers
+        base = stats.packets
+        return timed_calls(
+            stats.add, [(t + base * 0.001, q + base) for t, q in packets]
+        )
+
+    return run
+
+
+def measure(run, repeat):
+    # Returns the seconds per operation of each repeat, after one warm up
+    run()
+
+    per_op = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        for _ in range(repeat):
+            ops, seconds = run()
+            per_op.append(seconds / ops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return per_op
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark the EMonitor's hot functions"
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument(
+        "--filter", action="append", help="only run benchmarks containing this"
+    )
+    parser.add_argument("--output", default="bench_suite.json")
+    parser.add_argument("--compare", help="results file to compare against")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="use an EGL context, for machines without a display",
+    )
+    args = parser.parse_args()
+
+    if args.headless:
+        pyglet.options["headless"] = True
+
+    # A hidden window is only needed for its GL context
+    window = pyglet.window.Window(width=64, height=64, visible=False)
+
+    base = None
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)["results"]
+
+    results = {}
+
+    print(f"{'benchmark':32s} {'min us':>9s} {'median us':>10s} {'spread':>7s}")
+
+    for name, setup in BENCHMARKS.items():
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+
+        cleanup = []
+        try:
+            per_op = measure(setup(args, cleanup), args.repeat)
+        finally:
+            for close in cleanup:
+                close()
+
+        median = statistics.median(per_op)
+        result = results[name] = {
+            "min_us": min(per_op) * 1e6,
+            "median_us": median * 1e6,
+            # Relative spread between repeats, to tell noise from a change
+            "spread": statistics.pstdev(per_op) / median if median else 0.0,
+            "repeat": args.repeat,
+        }
+
+        line = (
+            f"{name:32s} {result['min_us']:9.3f} {result['median_us']:10.3f} "
+            f"{result['spread'] * 100:6.1f}%"
+        )
+
+        if base is not None and name in base:
+            change = result["median_us"] / base[name]["median_us"] - 1
+            line += f"  {change * 100:+6.1f}% vs {args.compare}"
+
+        print(line)
+
+    window.close()
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "commit": git_commit(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "pyglet": pyglet.version,
+                "platform": platform.platform(),
+                "renderer": pyglet.gl.gl_info.get_renderer(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+
+    print("Wrote", args.output)
+
+
+if __name__ == "__main__":
+    main()
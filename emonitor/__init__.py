@@ -0,0 +1,5 @@
+"""emonitor
+
+Shared pieces of the EMonitor, used by both EMonitorPyglet.py and
+EMonitorPyglet_v2.py
+"""
@@ -0,0 +1,6 @@
+from emonitor.app import main
+
+# Guarded, since a network process (--split) imports this module again on
+# Windows
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,881 @@
+"""The EMonitor window
+
+Replaces .NET EMonitor for experiment at Northwestern RSC Lab. One program
+for both protocols: version 1 always shows the circles, version 2 shows the
+photos in the images directory while the CurrState variable sent by ACT4D
+is 0. Which scene each state shows is set by emonitor.scene.state_registry.
+
+Nothing happens on import. EMonitorApp finds the network and loads the
+sounds on other threads while it opens the window and lists the photos,
+and run() shows it until escape is pressed.
+EMonitorPyglet.py and EMonitorPyglet_v2.py start it with their settings, or
+run it from the repository root:
+    python -m emonitor --version 2
+"""
+
+import argparse, os, time
+from concurrent.futures import ThreadPoolExecutor
+
+import ifaddr, pyglet
+
+from emonitor.assets import StartupTimer, load_sound_files
+from emonitor.latency import LatencyOverlay, LatencyTracker
+from emonitor.mirror import MIRROR_FRAME_RATE, MirrorWindow
+from emonitor.monitor import EMonitor
+from emonitor.photos import IMAGE_EXTENSIONS, PhotoLibrary, photo_paths
+from emonitor.processes import NetworkProcess, SharedSample
+from emonitor.profiler import (
+    CAPTURE_KEY,
+    TOGGLE_KEY,
+    StageProfiler,
+    replace_handler,
+)
+from emonitor.receiver import ReceivePoller
+from emonitor.replay import Replayer, recording_packets
+from emonitor.scene import (
+    BlankScene,
+    NormalProtocolScene,
+    PhotoScene,
+    WHITE,
+    state_registry,
+)
+from emonitor.shared import default_name
+from emonitor.sound import CuePlayer
+from emonitor.stats import signal_lost
+
+PORT = 5005
+SCREEN_INDEX = 1
+
+# The network adapter to listen on, when no address is given
+ETHERNET_ADAPTER = "Ethernet"
+
+# Kernel receive buffer asked for, in bytes, so a burst of packets from
+# Simulink waits there instead of being dropped
+RECEIVE_BUFFER = 1 << 20
+
+# How often packets are read per second when only redrawing on change
+POLL_FREQUENCY = 500
+
+# Seconds without a packet before the signal counts as lost
+SIGNAL_DEADLINE = 0.5
+
+RECORDING_DIRECTORY = "recordings"
+
+SOUND_DIRECTORY = "soundCues"
+
+# Decoded sounds, so they don't need decoding again on the next start
+SOUND_CACHE_DIRECTORY = "soundCache"
+
+# Cues may share a file, which is only loaded once
+FILE_NAMES = [
+    "hold.wav",
+    "in.wav",
+    "out.wav",
+    "match.wav",
+    "relax.wav",
+    "startingtrial.wav",
+    "endingtrial.wav",
+    "Out of Range.wav",
+    "Wrong Direction.wav",
+    "in.wav",
+    "out.wav",
+    "up.wav",
+    "down.wav",
+]
+
+IMAGE_DIRECTORY = "images/"
+
+# Most photo textures kept at once, and threads decoding photos
+PHOTO_CACHE_SIZE = 8
+PHOTO_WORKERS = 2
+
+"""
+    NOTE
+
+    ETHERNET NOTES!
+
+    If issues with ethernet connection arise, I recommend first unplugging
+    and replugging in the ethernet wires in the switch (all of them)
+
+    If this fails, restart the PC with the Ethernet cable unplugged
+
+    If the NU Ethernet system is down, do not plug the Ethernet wire into the
+    switch; this will prevent the computer from creating its own local ip
+
+    If the connection starts being slow, check the ping speeds with cmd prompt
+
+    Odds are it's due to a loose wire
+"""
+
+
+def find_ethernet_ip(adapter_name=ETHERNET_ADAPTER):
+    # Returns the IPv4 address of the adapter called adapter_name, or
+    # localhost
+    ip = None
+
+    for adapter in ifaddr.get_adapters():
+        if adapter.ips[0].nice_name == adapter_name:
+            ip = [x.ip for x in adapter.ips]
+
+    ethernet_ip = None
+
+    if ip:
+        for i in ip:
+            if type(i) == str and i.count(".") == 3:
+                ethernet_ip = i
+
+    if not ethernet_ip:
+        print("Issue detecting ethernet interface!")
+        print("Reverting to localhost ip")
+        ethernet_ip = "localhost"
+
+    return ethernet_ip
+
+
+def sound_paths(directory=SOUND_DIRECTORY, file_names=FILE_NAMES):
+    return [os.path.join(directory, file) for file in file_names]
+
+
+def load_sounds(
+    directory=SOUND_DIRECTORY,
+    file_names=FILE_NAMES,
+    cache_directory=SOUND_CACHE_DIRECTORY,
+):
+    paths = sound_paths(directory, file_names)
+    sound_cues, n_files, cached = load_sound_files(paths, cache_directory)
+
+    print(
+        f"Loaded {len(sound_cues)} / {len(file_names)} sounds successfully "
+        f"({n_files} files, {cached} from the cache)"
+    )
+
+    return sound_cues
+
+
+def load_photos(width, height, directory=IMAGE_DIRECTORY, extensions=IMAGE_EXTENSIONS):
+    # Only lists the photos; they are decoded in the background, to fit in
+    # width x height, as they are needed
+    photos = PhotoLibrary(
+        photo_paths(directory, extensions),
+        width,
+        height,
+        PHOTO_CACHE_SIZE,
+        PHOTO_WORKERS,
+    )
+    print(f"Found {len(photos)} photos")
+
+    return photos
+
+
+class ChangeDrivenEventLoop(pyglet.app.EventLoop):
+    """
+    Only redraws a window when its invalid flag is set
+
+    pyglet's own loop redraws every window whenever a scheduled function has
+    run, which with packets polled on a schedule is all the time
+    """
+
+    def idle(self):
+        dt = self.clock.update_time()
+        self.clock.call_scheduled_functions(dt)
+
+        for window in pyglet.app.windows:
+            if window.invalid:
+                window.switch_to()
+                window.dispatch_event("on_draw")
+                window.flip()
+
+        return self.clock.get_sleep_time(True)
+
+
+class EMonitorApp:
+    """
+    The EMonitor window, its sounds and photos, and where its packets come
+    from
+
+    ip defaults to the address of the adapter called interface. The socket
+    asks for a kernel receive buffer of rcvbuf bytes, lets other sockets
+    bind the port with reuse_address, and with kernel_timestamps takes each
+    packet's receive time from the kernel (Linux only). Packets are read on a
+    background thread with receive_on_thread, every packet is recorded to
+    RECORDING_DIRECTORY with record_session, every sample is written to
+    shared memory for other processes with share_state (see
+    emonitor.shared), and replay_file is replayed at
+    replay_speed instead of reading the socket. With track_latency the p50
+    and p99 packet-to-screen latency is shown next to the FPS, from the
+    sender's timestamps with same_clock, when the sender runs on this
+    machine.
+
+    Packets on the socket are read by a ReceivePoller poll_frequency times
+    a second, or every time the event loop spins if it is None. With
+    readiness_poll the socket is only read when a selector says a packet is
+    waiting.
+
+    By default the window is redrawn as often as the event loop spins. With
+    redraw_on_change, packets are read POLL_FREQUENCY times a second unless
+    poll_frequency is given, and the window is only redrawn (paced by vsync)
+    when they change what is shown, the state or the sounds, so a frame that
+    would look the same as the last one costs next to nothing.
+
+    With split_processes, the socket, decoding, recording and sound cues
+    are moved to a NetworkProcess, and the window only reads the newest
+    sample from the shared memory it publishes to (see emonitor.processes),
+    so nothing they do can delay a frame. It isn't used for replays.
+
+    With mirror_screen, a MirrorWindow on that screen shows the experimenter
+    what the subject sees, with the values written out, mirror_frame_rate
+    times a second. Once no packet has arrived for signal_deadline seconds,
+    the signal is lost: it is printed, and shown in the mirror.
+
+    With profile_stages, the time each stage of a frame takes is shown over
+    the window from the start (see emonitor.profiler); F8 turns it on and
+    off either way, and F9 starts and stops a cProfile capture.
+
+    sound_cues and photos may be given already loaded, e.g. to share them
+    between the EMonitors of several rigs (see emonitor.rigs). The window is
+    only fullscreen with fullscreen, and only waits for vsync with vsync.
+    """
+
+    def __init__(
+        self,
+        version=2,
+        ip=None,
+        port=PORT,
+        screen_index=SCREEN_INDEX,
+        receive_on_thread=False,
+        record_session=False,
+        share_state=False,
+        split_processes=False,
+        replay_file=None,
+        replay_speed=1.0,
+        track_latency=False,
+        same_clock=False,
+        redraw_on_change=False,
+        poll_frequency=None,
+        readiness_poll=False,
+        interface=ETHERNET_ADAPTER,
+        rcvbuf=RECEIVE_BUFFER,
+        reuse_address=False,
+        kernel_timestamps=False,
+        mirror_screen=None,
+        mirror_frame_rate=MIRROR_FRAME_RATE,
+        signal_deadline=SIGNAL_DEADLINE,
+        profile_stages=False,
+        sound_cues=None,
+        photos=None,
+        fullscreen=True,
+        vsync=True,
+    ):
+        self.version = version
+        self.port = port
+        self.receive_on_thread = receive_on_thread
+        self.record_session = record_session
+        self.share_state = share_state
+        self.split_processes = split_processes and not replay_file
+        self.replay_file = replay_file
+        self.replay_speed = replay_speed
+        self.redraw_on_change = redraw_on_change
+        self.readiness_poll = readiness_poll
+
+        if redraw_on_change and poll_frequency is None:
+            poll_frequency = POLL_FREQUENCY
+
+        self.poll_frequency = poll_frequency
+        self.poller = None
+        self.network = None
+        self.shared_sample = None
+
+        self.signal_deadline = signal_deadline
+        self.signal_lost = False
+
+        self.profile_stages = profile_stages
+        self.profiling = False
+        self.untimed = None
+
+        self.startup = StartupTimer()
+
+        # The network lookup and the sounds don't need the window, so they
+        # are done on other threads while it opens, which has to be here
+        with ThreadPoolExecutor(2, thread_name_prefix="emonitor-startup") as pool:
+            ip_lookup = None
+            if ip is None:
+                ip_lookup = pool.submit(
+                    self.startup.timed, "network", find_ethernet_ip, interface
+                )
+
+            # A network process loads the sounds itself
+            sound_loading = None
+            if sound_cues is None and not self.split_processes:
+                sound_loading = pool.submit(self.startup.timed, "sounds", load_sounds)
+
+            with self.startup.phase("window"):
+                self.open_window(screen_index, fullscreen, vsync)
+
+            # Only version 2 shows photos
+            if version == 1:
+                photos = None
+            elif photos is None:
+                with self.startup.phase("photos"):
+                    photos = load_photos(self.window.width, self.window.height)
+
+            self.photos = photos
+
+            if ip_lookup is not None:
+                ip = ip_lookup.result()
+            if sound_loading is not None:
+                sound_cues = sound_loading.result()
+
+            self.sound_cues = sound_cues
+
+        print("Using Ethernet IP:", ip)
+        print("Using Ethernet Remote Port", port)
+
+        # Given to the network process, which opens the socket
+        self.ip = ip
+        self.socket_options = dict(
+            rcvbuf=rcvbuf,
+            reuse_address=reuse_address,
+            kernel_timestamps=kernel_timestamps,
+        )
+
+        # Initialize the EMonitor; it only opens the port if it receives the
+        # packets itself, not when a network process does or a file is replayed
+        self.emonitor = EMonitor(
+            ip,
+            None if self.split_processes or replay_file else port,
+            version=version,
+            **self.socket_options,
+        )
+
+        # Each cue gets its own player now, and is played on the sound
+        # engine's thread as soon as a packet triggers it
+        if self.sound_cues is not None:
+            self.emonitor.start_sounds([CuePlayer(cue) for cue in self.sound_cues])
+        self.sound_events = 0
+
+        if self.photos is not None:
+            self.emonitor.photos = self.photos
+
+            # Photos that finish decoding are made into textures between
+            # frames, so they are ready before state 0 comes up. Scheduling
+            # it again for a shared library does nothing
+            pyglet.clock.unschedule(self.photos.upload)
+            pyglet.clock.schedule_interval(self.photos.upload, 0.1)
+
+        self.latency = None
+        if track_latency:
+            self.latency = LatencyTracker(self.emonitor, same_clock)
+            self.latency.install(self.window)
+            self.latency_display = LatencyOverlay(self.latency)
+
+        # Scenes are made the first time their state comes up, at the size the
+        # window is then; they are all remade if the window ever changes size
+        self.scenes = state_registry(
+            version,
+            lambda: NormalProtocolScene(self.window.width, self.window.height, 3),
+            lambda: PhotoScene(self.window.width, self.window.height),
+            BlankScene,
+            self.photos is not None and len(self.photos) > 0,
+        )
+        self.scene_size = None
+        self.scene = None
+
+        self.window.push_handlers(on_draw=self.on_draw, on_key_press=self.on_key_press)
+        self.profiler = StageProfiler()
+
+        if redraw_on_change:
+            self.window.push_handlers(
+                on_expose=self.invalidate, on_resize=self.invalidate
+            )
+
+        self.mirror = None
+        if mirror_screen is not None:
+            with self.startup.phase("mirror"):
+                self.open_mirror(mirror_screen, mirror_frame_rate)
+
+        print("Startup:", self.startup.report())
+
+    def open_window(self, screen_index, fullscreen=True, vsync=True):
+        display = pyglet.canvas.get_display()
+        screens = display.get_screens()
+
+        if len(screens) <= screen_index:
+            print("Using default display")
+            screen_index = 0
+
+        print(f"{screen_index = }")
+
+        # Create objects for the pyglet window and fps display. vsync paces
+        # the redraws when they only happen on a change
+        screen = screens[screen_index]
+        if fullscreen:
+            self.window = pyglet.window.Window(
+                fullscreen=True, screen=screen, vsync=vsync
+            )
+        else:
+            self.window = pyglet.window.Window(
+                screen.width // 2, screen.height // 2, resizable=True, vsync=vsync
+            )
+            self.window.set_location(screen.x + 50, screen.y + 50)
+        self.fps_display = pyglet.window.FPSDisplay(window=self.window)
+
+        # set background color as white
+        pyglet.gl.glClearColor(*WHITE, 255)
+
+    def open_mirror(self, screen_index, frame_rate):
+        screens = pyglet.canvas.get_display().get_screens()
+
+        if len(screens) <= screen_index:
+            print(f"No screen {screen_index} for the mirror window")
+            return
+
+        self.mirror = MirrorWindow(self, screens[screen_index], frame_rate)
+
+        # pyglet only exits once every window is closed, so escape on the
+        # subject window would otherwise leave the mirror running
+        self.window.push_handlers(on_close=self.close_mirror)
+
+    def close_mirror(self):
+        self.mirror.close()
+        pyglet.app.exit()
+
+    def update_frame(self):
+        """
+        Brings the scene up to date with the monitor, and returns True if
+        anything changed, or if a sound was played or stopped since the last
+        call
+        """
+        window = self.window
+        emonitor = self.emonitor
+
+        if self.scene_size != (window.width, window.height):
+            self.scenes.clear(emonitor)
+            self.scene_size = (window.width, window.height)
+
+        scene = self.scenes.switch(int(emonitor.state), emonitor)
+        changed = scene.update(emonitor) or scene is not self.scene
+        self.scene = scene
+
+        # Sound stuff here
+        if emonitor.sounds is not None and emonitor.sounds.events != self.sound_events:
+            self.sound_events = emonitor.sounds.events
+            changed = True
+
+        return changed
+
+    def on_draw(self):
+        try:
+            window = self.window
+
+            # When redrawing on change the poll has already updated the
+            # scene, unless the window has just been made or resized
+            if not self.redraw_on_change or self.scene_size != (
+                window.width,
+                window.height,
+            ):
+                self.update_frame()
+
+            window.clear()
+            self.fps_display.draw()
+            self.scene.draw()
+
+        except Exception as e:
+            print(f"Something bad occured drawing the window: {e!r}")
+
+        if self.latency is not None:
+            self.latency_display.draw()
+            self.latency.submitted()
+
+        if self.redraw_on_change:
+            # Not drawn again until a poll changes something, or the window
+            # is exposed or resized
+            self.window.invalid = False
+
+    def on_draw_profiled(self):
+        # on_draw, timing each stage; used in its place while profiling
+        lap = self.profiler.lap
+        t = time.perf_counter()
+
+        try:
+            window = self.window
+
+            # update_frame times itself while profiling
+            if not self.redraw_on_change or self.scene_size != (
+                window.width,
+                window.height,
+            ):
+                self.update_frame()
+
+            t = time.perf_counter()
+            window.clear()
+            t = lap("clear", t)
+
+            self.fps_display.draw()
+            t = lap("fps", t)
+
+            for stage, draw in self.scene.draw_stages():
+                draw()
+                t = lap(stage, t)
+
+        except Exception as e:
+            print(f"Something bad occured drawing the window: {e!r}")
+
+        if self.latency is not None:
+            self.latency_display.draw()
+            self.latency.submitted()
+
+        self.profiler.draw()
+        lap("overlays", t)
+
+        if self.redraw_on_change:
+            self.window.invalid = False
+
+    def on_key_press(self, symbol, modifiers):
+        if symbol == TOGGLE_KEY:
+            self.set_profiling(not self.profiling)
+            return pyglet.event.EVENT_HANDLED
+
+        if symbol == CAPTURE_KEY:
+            self.profiler.toggle_capture()
+            return pyglet.event.EVENT_HANDLED
+
+    def set_profiling(self, on):
+        """
+        Swaps the timed on_draw, packet reading, scene update, sound scan and
+        flip in for the usual ones, or back, so nothing is timed while
+        profiling is off. Only once start() has scheduled the updates
+        """
+        if on == self.profiling:
+            return
+
+        self.profiling = on
+        window = self.window
+        sounds = self.emonitor.sounds
+        timed = self.profiler.timed
+
+        pyglet.clock.unschedule(self.update)
+
+        if on:
+            self.untimed = (self.receive, window.flip)
+            self.receive = timed("receive", self.receive)
+            self.update_frame = timed("update", self.update_frame)
+            window.flip = timed("flip", window.flip)
+
+            if sounds is not None:
+                sounds.on_packet = timed("sounds", sounds.on_packet)
+                self.emonitor.bind_hooks()
+
+            replace_handler(window, "on_draw", self.on_draw, self.on_draw_profiled)
+
+        else:
+            self.receive, window.flip = self.untimed
+            self.untimed = None
+            del self.update_frame
+
+            if sounds is not None:
+                del sounds.on_packet
+                self.emonitor.bind_hooks()
+
+            replace_handler(window, "on_draw", self.on_draw_profiled, self.on_draw)
+
+        # poll looks receive up every time, but a receive scheduled on its
+        # own is the one that was scheduled
+        self.update = self.poll if self.redraw_on_change else self.receive
+        self.schedule_update()
+
+    def invalidate(self, *args):
+        self.window.invalid = True
+
+    def poll(self, dt):
+        # Reads the packets that have come in, and redraws the window only if
+        # they changed anything. Used in place of redrawing every frame
+        self.receive(dt)
+
+        try:
+            changed = self.update_frame()
+
+        except Exception as e:
+            print(f"Something bad occured updating the window: {e!r}")
+            return
+
+        if changed:
+            self.window.invalid = True
+
+    def check_signal(self, dt):
+        # Says when the packets stop for longer than the deadline, and when
+        # they come back. Uses the shown sample, so it works however the
+        # packets are received
+        # dt will not be used, but we need to give an extra input for pyglet
+        lost = signal_lost(
+            self.emonitor.last_receive_time,
+            time.perf_counter(),
+            self.signal_deadline,
+        )
+
+        if lost != self.signal_lost:
+            self.signal_lost = lost
+
+            if lost:
+                print(f"Signal lost: no packets for {self.signal_deadline:g} s")
+            else:
+                print("Signal back")
+
+    def start(self, receive=None):
+        """
+        Starts recording and reading packets, and schedules the window's
+        updates, ready for pyglet.app.run. receive replaces the usual way of
+        reading packets if given, e.g. with read_latest_sample when another
+        thread receives them
+        """
+        emonitor = self.emonitor
+
+        record_path = None
+        if self.record_session:
+            os.makedirs(RECORDING_DIRECTORY, exist_ok=True)
+            record_path = os.path.join(
+                RECORDING_DIRECTORY,
+                time.strftime(f"session_%Y%m%d_%H%M%S_{self.port}.emrec"),
+            )
+
+        if self.split_processes and receive is None:
+            # The network process records, and always shares the samples,
+            # which is how they get to this one
+            self.network = NetworkProcess(
+                default_name(self.port),
+                ip=self.ip,
+                port=self.port,
+                version=self.version,
+                sound_files=sound_paths(),
+                sound_cache=SOUND_CACHE_DIRECTORY,
+                record_path=record_path,
+                **self.socket_options,
+            )
+            self.network.start()
+            print("Sharing samples as", self.network.name)
+
+            self.shared_sample = SharedSample(emonitor, self.network.name)
+            receive = self.shared_sample.read
+
+        else:
+            if record_path is not None:
+                emonitor.start_recording(record_path)
+
+            if self.share_state:
+                name = default_name(self.port)
+                emonitor.start_publishing(name)
+                print("Sharing samples as", name)
+
+        if receive is not None:
+            self.receive = receive
+        elif self.replay_file:
+            replayer = Replayer(
+                emonitor, recording_packets(self.replay_file), self.replay_speed
+            )
+            self.receive = replayer.tick
+        elif self.receive_on_thread:
+            emonitor.start_receiver_thread()
+            self.receive = emonitor.read_latest_sample
+        else:
+            self.poller = ReceivePoller(emonitor, self.readiness_poll)
+            self.receive = self.poller.poll
+
+        if self.redraw_on_change or self.mirror is not None:
+            # pyglet.app.run and exit use whichever loop is here. The subject
+            # window stays invalid unless only redrawing on change, so it is
+            # still redrawn every frame, and the mirror at its own rate
+            pyglet.app.event_loop = ChangeDrivenEventLoop()
+
+        self.update = self.poll if self.redraw_on_change else self.receive
+        self.schedule_update()
+
+        pyglet.clock.schedule_interval(self.check_signal, 0.1)
+
+        if self.profile_stages:
+            self.set_profiling(True)
+
+    def schedule_update(self):
+        if self.poll_frequency:
+            pyglet.clock.schedule_interval(self.update, 1 / self.poll_frequency)
+        else:
+            # Call the update function to be run on every frame
+            pyglet.clock.schedule(self.update)
+
+    def stop(self):
+        # Stops everything start() started, and prints what was measured
+        emonitor = self.emonitor
+
+        emonitor.stop_receiver_thread()
+        emonitor.stop_recording()
+        emonitor.stop_publishing()
+        emonitor.stop_sounds()
+
+        if self.shared_sample is not None:
+            self.shared_sample.close()
+
+        if self.network is not None:
+            # Prints what it measured itself
+            self.network.stop()
+
+        if self.photos is not None:
+            self.photos.close()
+
+        pyglet.clock.unschedule(self.check_signal)
+
+        if self.profiler.capture is not None:
+            self.profiler.stop_capture()
+
+        if emonitor.sounds is not None:
+            print("Sounds:", emonitor.sounds.report())
+
+        # A network process prints its own
+        if self.network is None:
+            print("Stream:", emonitor.stats.report())
+
+        if self.poller is not None:
+            print("Receive:", self.poller.report())
+            self.poller.close()
+
+        if self.latency is not None:
+            print("Latency:")
+            for line in self.latency.report():
+                print(line)
+
+        lines = self.profiler.lines()
+        if lines:
+            print("Stages:")
+            for line in lines:
+                print(line)
+
+    def run(self):
+        self.start()
+        pyglet.app.run()
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the EMonitor")
+    parser.add_argument(
+        "--version", type=int, default=2, help="ACT4D packet protocol, 1 or 2"
+    )
+    parser.add_argument(
+        "--ip", help="address to listen on (default: that of --interface)"
+    )
+    parser.add_argument(
+        "--interface",
+        default=ETHERNET_ADAPTER,
+        help=f"network adapter to listen on (default: {ETHERNET_ADAPTER})",
+    )
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument(
+        "--rcvbuf",
+        type=int,
+        default=RECEIVE_BUFFER,
+        help="kernel receive buffer in bytes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--reuse-address",
+        action="store_true",
+        help="let other sockets bind the same port",
+    )
+    parser.add_argument(
+        "--kernel-timestamps",
+        action="store_true",
+        help="take receive times from the kernel (Linux only)",
+    )
+    parser.add_argument("--screen", type=int, default=SCREEN_INDEX)
+    parser.add_argument(
+        "--mirror",
+        type=int,
+        metavar="SCREEN",
+        help="show a mirror of the window for the experimenter on this screen",
+    )
+    parser.add_argument(
+        "--mirror-frame-rate",
+        type=float,
+        default=MIRROR_FRAME_RATE,
+        help="redraws of the mirror per second (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--signal-deadline",
+        type=float,
+        default=SIGNAL_DEADLINE,
+        help="seconds without a packet before the signal is lost "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--thread", action="store_true", help="receive on a background thread"
+    )
+    parser.add_argument(
+        "--record", action="store_true", help="record the session to recordings/"
+    )
+    parser.add_argument(
+        "--share",
+        action="store_true",
+        help="share every sample with other processes through shared memory",
+    )
+    parser.add_argument(
+        "--split",
+        action="store_true",
+        help="receive, record and play sounds in a separate process",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="show how long each stage of a frame takes (F8 toggles it)",
+    )
+    parser.add_argument("--replay", help="replay this recording instead")
+    parser.add_argument("--replay-speed", type=float, default=1.0)
+    parser.add_argument(
+        "--latency",
+        action="store_true",
+        help="measure the latency, and show it next to the FPS",
+    )
+    parser.add_argument(
+        "--same-clock",
+        action="store_true",
+        help="the sender runs on this machine, so its timestamps count",
+    )
+    parser.add_argument(
+        "--on-change",
+        action="store_true",
+        help="only redraw when the packets change what is shown",
+    )
+    parser.add_argument(
+        "--poll-frequency",
+        type=float,
+        help="reads of the socket per second (default: every frame, or "
+        f"{POLL_FREQUENCY} with --on-change)",
+    )
+    parser.add_argument(
+        "--select",
+        action="store_true",
+        help="only read the socket when a selector says a packet is waiting",
+    )
+    args = parser.parse_args(argv)
+
+    app = EMonitorApp(
+        version=args.version,
+        ip=args.ip,
+        port=args.port,
+        screen_index=args.screen,
+        receive_on_thread=args.thread,
+        record_session=args.record,
+        share_state=args.share,
+        split_processes=args.split,
+        replay_file=args.replay,
+        replay_speed=args.replay_speed,
+        track_latency=args.latency,
+        same_clock=args.same_clock,
+        redraw_on_change=args.on_change,
+        poll_frequency=args.poll_frequency,
+        readiness_poll=args.select,
+        interface=args.interface,
+        rcvbuf=args.rcvbuf,
+        reuse_address=args.reuse_address,
+        kernel_timestamps=args.kernel_timestamps,
+        mirror_screen=args.mirror,
+        mirror_frame_rate=args.mirror_frame_rate,
+        signal_deadline=args.signal_deadline,
+        profile_stages=args.profile,
+    )
+    app.run()
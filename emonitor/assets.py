@@ -0,0 +1,153 @@
+"""Loading the EMonitor's sounds, and timing startup
+
+Sound cues are decoded once into a cache directory of raw PCM files, each
+with a header holding its audio format and the size and modification time
+of the sound file it came from. A cache file is only used while those
+still match, so a changed sound file is decoded again. Loading from the
+cache skips pyglet's decoders entirely, which on Windows are the slowest
+part of starting up.
+"""
+
+import contextlib, os, struct, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import pyglet
+from pyglet.media.codecs.base import AudioFormat, StaticSource
+
+# magic, channels, sample size, sample rate, source size, source mtime (ns)
+CACHE_HEADER = struct.Struct("<4sHHIqq")
+CACHE_MAGIC = b"PCM1"
+
+
+class CachedSound(StaticSource):
+    """A StaticSource of PCM data read from the cache, with no decoding"""
+
+    def __init__(self, data, audio_format):
+        self.audio_format = audio_format
+        self._data = data
+        self._duration = len(data) / audio_format.bytes_per_second
+
+
+def cache_path(cache_directory, path):
+    return os.path.join(cache_directory, os.path.basename(path) + ".pcm")
+
+
+def read_cached_sound(cache_file, stat):
+    # Returns the cached sound, or None if there is none for this version of
+    # the sound file
+    try:
+        with open(cache_file, "rb") as f:
+            header = f.read(CACHE_HEADER.size)
+            if len(header) != CACHE_HEADER.size:
+                return None
+
+            magic, channels, sample_size, sample_rate, size, mtime = (
+                CACHE_HEADER.unpack(header)
+            )
+            if (magic, size, mtime) != (CACHE_MAGIC, stat.st_size, stat.st_mtime_ns):
+                return None
+
+            data = f.read()
+
+    except FileNotFoundError:
+        return None
+
+    return CachedSound(data, AudioFormat(channels, sample_size, sample_rate))
+
+
+def write_cached_sound(cache_file, sound, stat):
+    f = sound.audio_format
+    header = CACHE_HEADER.pack(
+        CACHE_MAGIC,
+        f.channels,
+        f.sample_size,
+        f.sample_rate,
+        stat.st_size,
+        stat.st_mtime_ns,
+    )
+
+    # Written beside the cache file and then moved over it, so a cache file
+    # is never read half written
+    temp = f"{cache_file}.{threading.get_ident()}.tmp"
+    with open(temp, "wb") as out:
+        out.write(header)
+        out.write(sound._data)
+
+    os.replace(temp, cache_file)
+
+
+def load_sound(path, cache_directory=None):
+    """
+    Returns (sound, cached), the decoded sound at path and whether it came
+    from cache_directory. Without a cache_directory, this is
+    pyglet.media.load(path, streaming=False)
+    """
+    if cache_directory is None:
+        return pyglet.media.load(path, streaming=False), False
+
+    stat = os.stat(path)
+    cache_file = cache_path(cache_directory, path)
+
+    sound = read_cached_sound(cache_file, stat)
+    if sound is not None:
+        return sound, True
+
+    sound = pyglet.media.load(path, streaming=False)
+
+    if sound.audio_format is not None:
+        try:
+            os.makedirs(cache_directory, exist_ok=True)
+            write_cached_sound(cache_file, sound, stat)
+        except OSError as e:
+            print(f"Couldn't cache {path}: {e!r}")
+
+    return sound, False
+
+
+def load_sound_files(paths, cache_directory=None, workers=4):
+    """
+    Loads the sounds at paths on a pool of threads, each file only once
+    however many times it is listed. Returns the sounds in the order of
+    paths, the number of distinct files and how many came from the cache
+    """
+    unique = list(dict.fromkeys(paths))
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="emonitor-sound-load") as pool:
+        loaded = dict(
+            zip(unique, pool.map(lambda p: load_sound(p, cache_directory), unique))
+        )
+
+    sounds = [loaded[path][0] for path in paths]
+    cached = sum(1 for sound, was_cached in loaded.values() if was_cached)
+
+    return sounds, len(unique), cached
+
+
+class StartupTimer:
+    """
+    Times the phases of starting up, some of which run at the same time on
+    other threads, and the whole of it
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def timed(self, name, function, *args, **kwargs):
+        # Calls function in a phase; for handing to another thread
+        with self.phase(name):
+            return function(*args, **kwargs)
+
+    def report(self):
+        total = time.perf_counter() - self.start
+        phases = ", ".join(f"{name} {seconds:.3f} s" for name, seconds in self.phases)
+
+        return f"{phases}; ready in {total:.3f} s"
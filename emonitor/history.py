@@ -0,0 +1,127 @@
+"""Fixed-size history of every received sample
+
+Keeps every decoded packet in a preallocated NumPy structured array that is
+used as a ring buffer, so memory doesn't grow over a session. Recent history
+can be taken as arrays for trails, statistics or logging.
+"""
+
+import math, struct
+
+import numpy as np
+
+# Field names match the EMonitor attributes. Packets without a state field
+# (the v1 layout) record NaN for it. Bit i of sounds is sound cue i, for the
+# first SOUND_BITS cues.
+SAMPLE_DTYPE = np.dtype(
+    [
+        ("receive_time", "f8"),
+        ("target_tor", "f8"),
+        ("low_lim_tor", "f8"),
+        ("up_lim_tor", "f8"),
+        ("match_tor", "f8"),
+        ("targetF", "f8"),
+        ("low_limF", "f8"),
+        ("up_limF", "f8"),
+        ("matchF", "f8"),
+        ("state", "f8"),
+        ("sounds", "u4"),
+        ("stop", "u1"),
+    ]
+)
+
+# A SAMPLE_DTYPE row, which is packed, so a row is written into the array's
+# buffer with one pack_into instead of the slower structured assignment
+SAMPLE_STRUCT = struct.Struct("<10dIB")
+
+# About a minute of samples at 1 kHz
+DEFAULT_CAPACITY = 65536
+
+SOUND_BITS = 32
+
+# Turns the bytes of a sequence of bools into binary digits
+BINARY_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def sound_mask(triggers):
+    # Packs a sequence of sound trigger bools into an int, bit i for cue i,
+    # with one int() call; cue 0 is the last binary digit
+    digits = bytes(triggers[SOUND_BITS - 1 :: -1]).translate(BINARY_DIGITS)
+    return int(digits, 2)
+
+
+def sample_record(receive_time, schema, values):
+    """
+    Returns a SAMPLE_DTYPE row for one decoded packet, given its
+    emonitor.protocol.Schema and the flat tuple unpacked by it
+    """
+    if schema.state_index is None:
+        state = math.nan
+    else:
+        state = values[schema.state_index]
+
+    # Most packets trigger nothing
+    triggers = values[schema.sound_index : schema.stop_index]
+    mask = sound_mask(triggers) if True in triggers else 0
+
+    return (receive_time, *values[:8], state, mask, values[schema.stop_index])
+
+
+class SampleHistory:
+    """
+    Ring buffer of samples decoded by emonitor.protocol.PacketDecoder
+
+    There is a single writer (the drain loop or the receiver thread). The
+    count is only advanced after a row is written, so readers only see
+    complete rows, as long as they don't fall a full capacity behind.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+
+        self.samples = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        assert SAMPLE_STRUCT.size == SAMPLE_DTYPE.itemsize
+
+        # Total number of samples ever appended
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, receive_time, schema, values):
+        """
+        Records one decoded packet, the flat tuple unpacked by its schema,
+        and returns its SAMPLE_DTYPE row as a tuple
+        """
+        row = sample_record(receive_time, schema, values)
+
+        SAMPLE_STRUCT.pack_into(
+            self.samples, (self.count % self.capacity) * SAMPLE_STRUCT.size, *row
+        )
+        self.count += 1
+
+        return row
+
+    def latest(self):
+        # Newest sample as a NumPy record, or None if nothing was received
+        if self.count == 0:
+            return None
+        return self.samples[(self.count - 1) % self.capacity]
+
+    def recent(self, n=None):
+        """
+        Returns the last n samples (all that are held by default), oldest
+        first
+
+        This is a view into the buffer if the samples don't wrap around the
+        end of it, and a copy if they do, so copy it before holding onto it
+        """
+        count = self.count
+        n = len(self) if n is None else min(n, len(self))
+
+        end = count % self.capacity
+        start = end - n
+
+        if start >= 0:
+            return self.samples[start:end]
+
+        return np.concatenate((self.samples[start:], self.samples[:end]))
@@ -0,0 +1,200 @@
+"""Packet-to-photon latency
+
+Follows each sample from the moment its packet is received until the frame
+showing it has been flipped to the screen, through these stages, all in
+seconds of time.perf_counter:
+    send:    sender timestamp -> receive (timed packets only)
+    decode:  receive -> decoded
+    submit:  receive -> the frame's draw calls were submitted
+    flip:    receive -> the frame was flipped
+    total:   sender timestamp -> the frame was flipped (timed packets only)
+
+The receive time is when the kernel stamped the packet if the socket was
+opened with kernel timestamps, and otherwise when Python read it, so decode
+then also holds the time the packet waited to be read.
+
+Only the first frame that shows a sample counts, so a sender that stops
+doesn't fill the histograms with one stale sample. The send and total stages
+need the sender's timestamp to come from the same clock, which it only does
+when the sender runs on the same machine, e.g. MatlabTests/data_sender.py,
+so they are only measured when the tracker is told so with same_clock. A
+remote Simulink model can still send the trailing sequence field, but its
+times are then ignored.
+"""
+
+import math, time
+
+import pyglet
+
+STAGES = ("send", "decode", "submit", "flip", "total")
+
+
+class StreamingHistogram:
+    """
+    Fixed log-spaced histogram of durations in seconds
+
+    Adding a value is O(1) and allocates nothing, so it can run every frame
+    for a whole session. Percentiles are accurate to about 5%.
+    """
+
+    def __init__(self, low=1e-5, high=10.0, bins_per_decade=50):
+        self.log_low = math.log10(low)
+        self.bins_per_decade = bins_per_decade
+        self.n_bins = int(math.ceil(math.log10(high / low) * bins_per_decade))
+
+        # The first and last bins also take everything below and above
+        self.bins = [0] * self.n_bins
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds > 0:
+            i = int((math.log10(seconds) - self.log_low) * self.bins_per_decade)
+            i = min(max(i, 0), self.n_bins - 1)
+        else:
+            i = 0
+
+        self.bins[i] += 1
+        self.count += 1
+
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        # Returns the upper edge of the bin holding the p-th percentile, or
+        # None if nothing was added
+        if self.count == 0:
+            return None
+
+        rank = p / 100 * self.count
+        seen = 0
+
+        for i, n in enumerate(self.bins):
+            seen += n
+            if seen >= rank and n:
+                edge = 10 ** (self.log_low + (i + 1) / self.bins_per_decade)
+                return min(edge, self.max)
+
+        return self.max
+
+
+class LatencyTracker:
+    """
+    Keeps a StreamingHistogram per stage for the samples shown by monitor;
+    send and total only with same_clock, when the sender's timestamps come
+    from this machine's time.perf_counter
+
+    Call submitted() at the end of on_draw; flipped() is called after the
+    window's flip once install() has hooked it, the same way pyglet's
+    FPSDisplay hooks it
+    """
+
+    def __init__(self, monitor, same_clock=False):
+        self.monitor = monitor
+        self.same_clock = same_clock
+        self.histograms = {stage: StreamingHistogram() for stage in STAGES}
+
+        self.last_receive_time = None
+        self.pending = None
+
+    def install(self, window):
+        self._window_flip = window.flip
+        window.flip = self._hook_flip
+
+    def _hook_flip(self):
+        self._window_flip()
+        self.flipped()
+
+    def submitted(self):
+        m = self.monitor
+        receive_time = m.last_receive_time
+
+        if receive_time is None or receive_time == self.last_receive_time:
+            self.pending = None
+            return
+
+        self.last_receive_time = receive_time
+        self.pending = (
+            m.last_send_time,
+            receive_time,
+            m.last_decode_time,
+            time.perf_counter(),
+        )
+
+    def flipped(self):
+        if self.pending is None:
+            return
+
+        flip_time = time.perf_counter()
+        send_time, receive_time, decode_time, submit_time = self.pending
+        self.pending = None
+
+        h = self.histograms
+        h["decode"].add(decode_time - receive_time)
+        h["submit"].add(submit_time - receive_time)
+        h["flip"].add(flip_time - receive_time)
+
+        if send_time is not None and self.same_clock:
+            h["send"].add(receive_time - send_time)
+            h["total"].add(flip_time - send_time)
+
+    def headline(self):
+        """
+        Returns the stage to show in the overlay: total if the packets carry
+        timestamps, otherwise flip
+        """
+        if self.histograms["total"].count:
+            return "total"
+        return "flip"
+
+    def report(self):
+        # One line per stage that has samples, in milliseconds
+        lines = []
+
+        for stage in STAGES:
+            h = self.histograms[stage]
+            if h.count == 0:
+                continue
+
+            lines.append(
+                f"{stage:7s} p50 {h.percentile(50) * 1000:7.2f} ms  "
+                f"p99 {h.percentile(99) * 1000:7.2f} ms  "
+                f"max {h.max * 1000:7.2f} ms  ({h.count} frames)"
+            )
+
+        return lines
+
+
+class LatencyOverlay:
+    """
+    Shows the tracker's p50/p99 next to the FPS display, in the same style
+
+    The label text is only changed every update_period seconds, since
+    laying it out again every frame would cost more than it measures
+    """
+
+    update_period = 0.5
+
+    def __init__(self, tracker, x=150, y=10):
+        self.tracker = tracker
+        self.label = pyglet.text.Label(
+            "", x=x, y=y, font_size=24, bold=True, color=(127, 127, 127, 127)
+        )
+        self.last_update = 0.0
+
+    def draw(self):
+        now = time.perf_counter()
+
+        if now - self.last_update >= self.update_period:
+            self.last_update = now
+
+            stage = self.tracker.headline()
+            h = self.tracker.histograms[stage]
+
+            if h.count:
+                self.label.text = (
+                    f"{stage} p50 {h.percentile(50) * 1000:.1f} "
+                    f"p99 {h.percentile(99) * 1000:.1f} ms"
+                )
+
+        self.label.draw()
@@ -0,0 +1,173 @@
+"""Experimenter mirror window
+
+Shows the experimenter what the subject sees, in a window on another
+screen, with the values of the last packet and the stream statistics
+written out over it, and SIGNAL LOST once the packets have stopped. Nothing
+is decoded or built twice: the mirror draws the subject window's current
+scene, whose shapes and photo textures live in GL objects shared by both
+windows, scaled down to fit, and reads the values straight off the EMonitor.
+
+The mirror redraws frame_rate times a second, and never waits for vsync, so
+it only takes a little of the time between the subject window's frames. It
+relies on the event loop only redrawing windows whose invalid flag is set
+(see emonitor.app.ChangeDrivenEventLoop).
+"""
+
+import time
+
+import pyglet
+
+from emonitor.scene import WHITE
+
+# How many times a second the mirror is redrawn
+MIRROR_FRAME_RATE = 15
+
+# Steps the age of the last packet is shown in, in seconds
+AGE_STEP = 0.1
+
+READOUT_COLOR = (60, 60, 60, 255)
+LOST_COLOR = (200, 0, 0, 255)
+
+
+class MirrorWindow:
+    """
+    A window on screen that mirrors app's subject window at frame_rate, at
+    width x height (default: half the size of the subject window)
+    """
+
+    def __init__(
+        self, app, screen, frame_rate=MIRROR_FRAME_RATE, width=None, height=None
+    ):
+        self.app = app
+        self.frame_rate = frame_rate
+
+        subject = app.window
+        if width is None:
+            width = subject.width // 2
+        if height is None:
+            height = subject.height // 2
+
+        self.window = pyglet.window.Window(
+            width,
+            height,
+            caption="EMonitor mirror",
+            resizable=True,
+            vsync=False,
+        )
+        self.window.set_location(screen.x + 50, screen.y + 50)
+
+        # The clear colour belongs to each window's context
+        pyglet.gl.glClearColor(*WHITE, 255)
+
+        self.readout = pyglet.text.Label(
+            "",
+            x=10,
+            y=height - 10,
+            anchor_y="top",
+            width=width - 20,
+            multiline=True,
+            font_size=11,
+            color=READOUT_COLOR,
+        )
+        self.readout_text = None
+
+        self.lost_label = pyglet.text.Label(
+            "SIGNAL LOST", x=10, y=10, font_size=24, bold=True, color=LOST_COLOR
+        )
+
+        self.frames = 0
+        self.closed = False
+
+        self.window.push_handlers(
+            on_draw=self.on_draw, on_resize=self.on_resize, on_close=self.on_close
+        )
+        pyglet.clock.schedule_interval(self.invalidate, 1 / frame_rate)
+
+    def invalidate(self, dt):
+        self.window.invalid = True
+
+    def on_resize(self, width, height):
+        self.readout.y = height - 10
+        self.readout.width = width - 20
+
+    def on_close(self):
+        # Closed by hand; the window closes itself after this
+        pyglet.clock.unschedule(self.invalidate)
+        self.closed = True
+
+    def close(self):
+        if not self.closed:
+            self.on_close()
+            self.window.close()
+
+    def readouts(self):
+        m = self.app.emonitor
+
+        lines = [
+            f"state {m.state:g}",
+            f"torque  target {m.target_tor:.3f}  limits {m.low_lim_tor:.3f} to "
+            f"{m.up_lim_tor:.3f}  match {m.match_tor:.3f}",
+            f"force   target {m.targetF:.3f}  limits {m.low_limF:.3f} to "
+            f"{m.up_limF:.3f}  match {m.matchF:.3f}",
+        ]
+
+        now = time.perf_counter()
+
+        # The age is rounded down to AGE_STEP, so while packets keep coming
+        # the text only changes with the values
+        if m.last_receive_time is not None:
+            age = now - m.last_receive_time
+            if age < AGE_STEP:
+                lines.append(f"last packet <{AGE_STEP * 1000:.0f} ms ago")
+            else:
+                lines.append(f"last packet {age // AGE_STEP * AGE_STEP:.1f} s ago")
+        else:
+            lines.append("no packets yet")
+
+        # Packets received in this process; none when a network process
+        # receives them
+        if m.stats.packets:
+            lines.append(m.stats.summary(now))
+
+        return "\n".join(lines)
+
+    def on_draw(self):
+        window = self.window
+        subject = self.app.window
+        scene = self.app.scene
+
+        window.clear()
+
+        if scene is not None:
+            # The subject's scene, scaled to fit and centered
+            scale = min(window.width / subject.width, window.height / subject.height)
+
+            pyglet.gl.glPushMatrix()
+            pyglet.gl.glTranslatef(
+                (window.width - subject.width * scale) / 2,
+                (window.height - subject.height * scale) / 2,
+                0,
+            )
+            pyglet.gl.glScalef(scale, scale, 1)
+
+            # The ring is drawn as points, which the matrix doesn't scale
+            pyglet.gl.glPointSize(max(1, scale))
+            scene.draw()
+            pyglet.gl.glPointSize(1)
+            pyglet.gl.glPopMatrix()
+
+        # Only laid out again when a value shown changes
+        text = self.readouts()
+        if text != self.readout_text:
+            self.readout_text = text
+            self.readout.text = text
+
+        self.readout.draw()
+
+        if self.app.signal_lost:
+            self.lost_label.draw()
+
+        self.frames += 1
+
+        # Not drawn again until the next invalidate
+        window.invalid = False
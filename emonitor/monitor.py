@@ -0,0 +1,379 @@
+"""EMonitor
+
+Receives and decodes the packets sent by the ACT4D Simulink model, and holds
+the values that the window shows. Shared by EMonitorPyglet.py (version 1
+packets) and EMonitorPyglet_v2.py (version 2 packets, which add the state).
+
+Nothing here opens a window, so the monitor can also be driven without one,
+e.g. by emonitor.replay.
+"""
+
+import random, time
+
+from emonitor.history import SampleHistory
+from emonitor.protocol import LEGACY_SOUNDS, PacketDecoder, schema
+from emonitor.receiver import (
+    LatestSample,
+    ReceiverThread,
+    kernel_timestamps_supported,
+    open_socket,
+    recv_packet,
+    recv_timestamped,
+)
+from emonitor.recorder import SessionRecorder
+from emonitor.shared import SharedStatePublisher
+from emonitor.sound import SoundEngine
+from emonitor.stats import StreamStats
+
+
+class EMonitor:
+    def __init__(
+        self,
+        ip="localhost",
+        port=5005,
+        screen_index=0,
+        version=1,
+        rcvbuf=None,
+        reuse_address=False,
+        kernel_timestamps=False,
+    ):
+        self.n_sounds = LEGACY_SOUNDS
+        self.version = version
+
+        # Decodes the packets of every protocol version, legacy or described
+        # by a header, with layouts compiled once. The version only decides
+        # what the window shows (see emonitor.scene.state_registry)
+        self.decoder = PacketDecoder(self.n_sounds)
+
+        # Layout of the shown values
+        self.schema = schema(version, self.n_sounds)
+
+        # Every received sample, not just the ones that get drawn
+        self.history = SampleHistory()
+
+        # Packet rate, gaps, drops and malformed packets
+        self.stats = StreamStats()
+
+        # Initialize the target forces
+        self.target_tor = 1
+        self.up_lim_tor = 1
+        self.target_tor = 1
+        self.match_tor = 1
+        self.low_lim_tor = 1
+
+        # Initialize Force Parameters
+        self.targetF = 1
+        self.up_limF = 1
+        self.low_limF = 1
+        self.matchF = 1
+
+        # Only sent in version 2 packets
+        self.state = 0
+
+        self.sound_trigger = [False for i in range(self.n_sounds)]
+        self.stop_trigger = 0
+
+        # Set by start_sounds
+        self.sounds = None
+
+        # What record_sample passes each packet on to; see bind_hooks
+        self.hooks = ()
+
+        self.graphics = []
+
+        # Set to a PhotoLibrary by the window, which is used in place of
+        # graphics
+        self.photos = None
+
+        # UDP Stuff
+        self.UDP_IP = ip
+        self.UDP_PORT = port
+
+        # A monitor with no port has no socket, and is fed packets some other
+        # way, e.g. a replayed session
+        self.sock = None
+
+        # Receive times come from the kernel if asked for and the OS can
+        if kernel_timestamps and not kernel_timestamps_supported():
+            print("Kernel receive timestamps aren't supported here")
+            kernel_timestamps = False
+
+        self.kernel_timestamps = kernel_timestamps
+        self.recv = recv_timestamped if kernel_timestamps else recv_packet
+
+        if port is not None:
+            self.sock = open_socket(
+                self.UDP_IP, self.UDP_PORT, rcvbuf, reuse_address, kernel_timestamps
+            )
+
+        # Packets are received into this buffer, so reading one allocates
+        # nothing. This 1460 buffer size is connected to the buffer size in
+        # the MATLAB sending code
+        self.buffer = bytearray(1460)
+        self.buffer_view = memoryview(self.buffer)
+
+        # Set when packets are read on a background thread instead; see
+        # start_receiver_thread
+        self.receiver = None
+        self.latest = LatestSample()
+        self.last_sample = None
+
+        # time.perf_counter() at which the shown values were received and
+        # decoded, and the sequence number and sender timestamp, if the
+        # packet had them
+        self.last_receive_time = None
+        self.last_decode_time = None
+        self.last_sequence = None
+        self.last_send_time = None
+
+        # Set by start_recording and start_publishing
+        self.recorder = None
+        self.publisher = None
+
+        # Graphics stuff below here
+        self.thread_running = True
+
+        self.last_image = None
+
+    def decode_udp_package(self, data):
+        """
+        Work out the package's layout from its header or its size, and return
+        (schema, values), with the values as one flat tuple in the order
+        below, or None if it is invalid
+
+        Legacy bytes structured as:
+        0-7: Target Torque (double)
+        8-15: Target Low Limit Torque (double)
+        16-23: Target Up Limit Torque (double)
+        24-31: Currently produced torque (double)
+
+        32-39: Target Force NM (double)
+        40-47: Target Low Limit Force (double)
+        48-55: Target Upper Limit Force (double)
+        56-63: Currently produced force (double)
+
+        Version 1:
+        64:64+n_sounds-1- one boolean byte for each sound cue (bool)
+        64+n_sounds- one byte representing if sounds should be stopped (bool)
+
+        Version 2:
+        64-71: Current state (double)
+        72:72+n_sounds-1- one boolean byte for each sound cue (bool)
+        72+n_sounds- one byte representing if sounds should be stopped (bool)
+
+        Optionally followed by:
+        4 bytes- sequence number (uint32)
+        8 bytes- sender timestamp (double)
+
+        Described packets have an 8 byte header first, giving the version
+        and the number of doubles and sound cues; see emonitor.protocol
+        """
+        # data may be a memoryview of the receive buffer; the values are
+        # copied out of it by a single call
+        packet = self.decoder.decode(data)
+
+        if packet is None:
+            self.stats.malformed += 1
+            self.stats.last_malformed_length = len(data)
+            print(f"ERROR! Incorrect length ({len(data)} bytes)")
+
+        return packet
+
+    def set_values(self, schema, values):
+        (
+            self.target_tor,
+            self.low_lim_tor,
+            self.up_lim_tor,
+            self.match_tor,
+            self.targetF,
+            self.low_limF,
+            self.up_limF,
+            self.matchF,
+        ) = values[:8]
+
+        self.schema = schema
+
+        if schema.state_index is not None:
+            self.state = values[schema.state_index]
+
+        self.sound_trigger = values[schema.sound_index : schema.stop_index]
+        self.stop_trigger = values[schema.stop_index]
+
+        if schema.timed:
+            self.last_sequence, self.last_send_time = values[schema.timing_index :]
+        else:
+            self.last_sequence = self.last_send_time = None
+
+    def unpack_udp_package(self, data, receive_time=None):
+        # Decodes the package, and records and shows its values if it is valid
+        if receive_time is None:
+            receive_time = time.perf_counter()
+
+        packet = self.record_udp_package(data, receive_time)
+
+        if packet is not None:
+            self.show_sample(receive_time, packet)
+
+    def record_udp_package(self, data, receive_time):
+        # Decodes the package and records it if it is valid, and returns it
+        # (or None). A drain loop records every package this way, and only
+        # shows the newest with show_sample
+        packet = self.decode_udp_package(data)
+
+        if packet is not None:
+            self.record_sample(receive_time, packet, data)
+
+        return packet
+
+    def show_sample(self, receive_time, packet):
+        self.last_decode_time = time.perf_counter()
+        self.last_receive_time = receive_time
+        self.set_values(*packet)
+
+    def record_sample(self, receive_time, packet, data):
+        # Keeps a valid (schema, values) package in the history and the
+        # stream statistics, and passes it on to the session recording,
+        # shared memory and sound engine hooks that are on
+        schema, values = packet
+
+        row = self.history.append(receive_time, schema, values)
+
+        if schema.timed:
+            self.stats.add(receive_time, values[schema.timing_index])
+        else:
+            self.stats.add(receive_time)
+
+        for hook in self.hooks:
+            hook(receive_time, schema, values, data, row)
+
+    def bind_hooks(self):
+        """
+        Binds the session recording, shared memory and sound engine methods
+        that are on into hooks, so record_sample calls only those, with no
+        checks per packet. Called again whenever one is started or stopped,
+        or one of their methods is swapped (e.g. by the stage profiler)
+        """
+        hooks = []
+
+        if self.recorder is not None:
+            append = self.recorder.append
+
+            def record(receive_time, schema, values, data, row):
+                append(receive_time, schema, values, data)
+
+            hooks.append(record)
+
+        if self.publisher is not None:
+            publish = self.publisher.publish
+
+            def share(receive_time, schema, values, data, row):
+                publish(row)
+
+            hooks.append(share)
+
+        if self.sounds is not None:
+            on_packet = self.sounds.on_packet
+
+            def play(receive_time, schema, values, data, row):
+                on_packet(
+                    receive_time,
+                    values[schema.sound_index : schema.stop_index],
+                    values[schema.stop_index],
+                )
+
+            hooks.append(play)
+
+        self.hooks = tuple(hooks)
+
+    def start_sounds(self, players, threaded=True):
+        """
+        Plays players[i] whenever a packet raises sound trigger i, and stops
+        them when one raises the stop trigger; see emonitor.sound
+        """
+        self.sounds = SoundEngine(players, threaded)
+        self.bind_hooks()
+
+    def stop_sounds(self):
+        if self.sounds is not None:
+            self.sounds.close()
+
+    def start_recording(self, path):
+        self.recorder = SessionRecorder(path, self.version, self.n_sounds)
+        self.bind_hooks()
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+            self.bind_hooks()
+
+    def start_publishing(self, name):
+        """
+        Writes every sample to the shared memory block name as well, for
+        emonitor.shared.SharedStateReader in other processes
+        """
+        self.publisher = SharedStatePublisher(name, self.history.capacity)
+        self.bind_hooks()
+
+    def stop_publishing(self):
+        if self.publisher is not None:
+            self.publisher.close()
+            self.publisher = None
+            self.bind_hooks()
+
+    def recieve_single_udp(self, dt):
+        # Function clears udp buffer, recording every message and showing the
+        # most recent one
+        # dt will not be used, but we need to give an extra input for pyglet
+        newest = None
+
+        while True:
+            try:
+                # Each packet is decoded before the next one overwrites it
+                nbytes, receive_time = self.recv(self.sock, self.buffer)
+
+            except BlockingIOError:
+                break
+
+            packet = self.record_udp_package(self.buffer_view[:nbytes], receive_time)
+            if packet is not None:
+                newest = receive_time, packet
+
+        if newest is not None:
+            self.show_sample(*newest)
+
+    def start_receiver_thread(self):
+        # Reads every packet on a background thread, blocking on the socket,
+        # in place of scheduling recieve_single_udp on the render loop
+        self.receiver = ReceiverThread(
+            self.sock,
+            self.decode_udp_package,
+            self.latest,
+            self.record_sample,
+            recv=self.recv,
+        )
+        self.receiver.start()
+
+    def stop_receiver_thread(self):
+        if self.receiver is not None:
+            self.receiver.stop()
+            self.receiver = None
+
+    def read_latest_sample(self, dt):
+        # Shows the newest sample from the receiver thread; never blocks
+        # dt will not be used, but we need to give an extra input for pyglet
+        sample = self.latest.read()
+
+        if sample is not self.last_sample:
+            self.last_sample = sample
+            self.last_receive_time, packet, self.last_decode_time = sample
+            self.set_values(*packet)
+
+    def choose_image(self):
+        # Picks the photo to show for this state 0 period, unless there is
+        # one already. Stays None if the photos haven't been decoded yet
+        if not self.last_image:
+            if self.photos is not None:
+                self.last_image = self.photos.choose()
+            else:
+                self.last_image = random.choice(self.graphics)
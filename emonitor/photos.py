@@ -0,0 +1,168 @@
+"""State 0 photos
+
+Only the list of photo files is read at startup. A PhotoLibrary decodes
+photos on background threads, already shrunk to fit the window when Pillow
+is installed, and keeps the textures of the last few shown. The photo for
+the next state 0 period is picked and decoded ahead of time, so entering
+state 0 never waits on the disk or a decoder; if it still isn't ready, one
+that is gets shown instead.
+"""
+
+import collections, os, random
+from concurrent.futures import ThreadPoolExecutor
+
+import pyglet
+
+try:
+    from PIL import Image
+except ImportError:
+    # Photos are then decoded by pyglet at full size, and scaled when drawn
+    Image = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def photo_paths(directory, extensions=IMAGE_EXTENSIONS):
+    # The photos in directory, in a fixed order
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith(extensions)
+    ]
+
+
+def fit_size(width, height, max_width, max_height):
+    """
+    Returns the size to draw a width x height photo at so that it fits in
+    max_width x max_height, keeping its shape; photos that already fit keep
+    their size
+    """
+    scale = min(max_width / width, max_height / height, 1.0)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def decode_photo(path, max_width, max_height):
+    """
+    Decodes the photo at path into an ImageData no bigger than max_width x
+    max_height. Doesn't touch OpenGL, so it can run on any thread
+    """
+    if Image is None:
+        return pyglet.image.load(path)
+
+    with Image.open(path) as image:
+        size = fit_size(image.width, image.height, max_width, max_height)
+
+        # Lets JPEGs be decoded at a fraction of their size to begin with
+        image.draft("RGB", size)
+
+        image = image.convert("RGBA")
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+
+        # pyglet's rows go bottom to top
+        image = image.transpose(Image.FLIP_TOP_BOTTOM)
+
+        return pyglet.image.ImageData(*size, "RGBA", image.tobytes())
+
+
+class PhotoLibrary:
+    """
+    The photos at paths, decoded by a pool of worker threads to fit in
+    width x height
+
+    choose() is called on the window's thread, which is the only one that
+    makes textures. At most capacity textures are kept, the least recently
+    shown being dropped first.
+    """
+
+    def __init__(self, paths, width, height, capacity=8, workers=2):
+        self.paths = list(paths)
+        self.width = width
+        self.height = height
+        self.capacity = capacity
+
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="emonitor-photo")
+
+        # index -> Future of the decoded ImageData
+        self.pending = {}
+
+        # index -> texture, least recently shown first
+        self.textures = collections.OrderedDict()
+
+        self.decoded = 0
+        self.failed = 0
+
+        # The photo the next state 0 period will show
+        self.next = None
+        if self.paths:
+            self.prefetch()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def prefetch(self):
+        # Picks the next photo at random, like random.choice did, and starts
+        # decoding it unless its texture is kept already
+        self.next = random.randrange(len(self.paths))
+        self.request(self.next)
+
+    def request(self, index):
+        if index in self.textures or index in self.pending:
+            return
+
+        self.pending[index] = self.pool.submit(
+            decode_photo, self.paths[index], self.width, self.height
+        )
+
+    def upload(self, dt=None):
+        """
+        Makes textures of the photos that have finished decoding. Called by
+        choose(), and may also be scheduled so they are ready before then
+        """
+        for index, future in list(self.pending.items()):
+            if not future.done():
+                continue
+
+            del self.pending[index]
+
+            try:
+                image = future.result()
+            except Exception as e:
+                print(f"Couldn't load {self.paths[index]}: {e!r}")
+                self.failed += 1
+
+                if index == self.next and self.failed < len(self.paths):
+                    self.prefetch()
+                continue
+
+            self.textures[index] = image.get_texture()
+            self.decoded += 1
+
+            while len(self.textures) > self.capacity:
+                self.textures.popitem(last=False)
+
+    def choose(self):
+        """
+        Returns the texture to show for a new state 0 period, and starts
+        decoding the one after it. Returns None if no photo has been decoded
+        yet
+        """
+        self.upload()
+
+        index = self.next
+        if index not in self.textures:
+            if not self.textures:
+                return None
+
+            # Still decoding; show the photo shown longest ago instead
+            index = next(iter(self.textures))
+
+        self.textures.move_to_end(index)
+        texture = self.textures[index]
+
+        self.prefetch()
+
+        return texture
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,182 @@
+"""Networking and sound in a process of their own
+
+Normally everything the EMonitor does runs in one interpreter: reading the
+socket, decoding, recording, the sound cues and drawing, so anything that
+holds the GIL for a while (recording, an online analysis) delays the next
+frame. With split_processes, EMonitorApp starts a NetworkProcess instead,
+which owns the socket, decodes and records every packet, plays the sound
+cues and publishes the samples to shared memory (see emonitor.shared). The
+window's process only copies the newest sample out of shared memory each
+frame, so nothing else in the network process can hold up its frames.
+
+Receive times are time.perf_counter() in the network process, which is
+the same system wide clock in every process on Windows and Linux, so the
+latencies measured by the window are still right. The shared samples don't
+carry sequence numbers or sender timestamps, so only the latency from
+receiving a packet to the flip is measured.
+"""
+
+import math, multiprocessing, time
+
+from emonitor.assets import load_sound_files
+from emonitor.monitor import EMonitor
+from emonitor.shared import SharedStateReader
+from emonitor.sound import CuePlayer
+
+
+def serve(
+    name,
+    ready,
+    stop,
+    ip="localhost",
+    port=5005,
+    version=2,
+    sound_files=None,
+    sound_cache=None,
+    record_path=None,
+    rcvbuf=None,
+    reuse_address=False,
+    kernel_timestamps=False,
+):
+    """
+    Runs a windowless EMonitor on port, publishing its samples to the shared
+    memory block name, until the event stop is set. The event ready is set
+    once the block exists. Plays sound_files as the sound cues, and records
+    the session to record_path if given
+    """
+    m = EMonitor(
+        ip,
+        port,
+        version=version,
+        rcvbuf=rcvbuf,
+        reuse_address=reuse_address,
+        kernel_timestamps=kernel_timestamps,
+    )
+
+    if sound_files:
+        sound_cues, n_files, cached = load_sound_files(sound_files, sound_cache)
+        m.start_sounds([CuePlayer(cue) for cue in sound_cues])
+
+    if record_path is not None:
+        m.start_recording(record_path)
+
+    m.start_publishing(name)
+    m.start_receiver_thread()
+    ready.set()
+
+    try:
+        stop.wait()
+
+    except KeyboardInterrupt:
+        # Ctrl+C reaches every process; the window's stops this one
+        stop.wait()
+
+    finally:
+        packets = m.receiver.packets
+
+        m.stop_receiver_thread()
+        m.stop_recording()
+        m.stop_publishing()
+        m.stop_sounds()
+        m.sock.close()
+
+        print(f"Network process: {packets} packets")
+        if m.sounds is not None:
+            print("Sounds:", m.sounds.report())
+        print("Stream:", m.stats.report())
+
+
+class NetworkProcess:
+    """
+    Runs serve() in another process, publishing to the shared memory block
+    name; the keyword arguments are passed on to it
+
+    target may be replaced, e.g. by a benchmark, with a function that takes
+    the same arguments and calls serve.
+    """
+
+    target = staticmethod(serve)
+
+    def __init__(self, name, **options):
+        self.name = name
+        self.ready = multiprocessing.Event()
+        self.stop_event = multiprocessing.Event()
+
+        self.process = multiprocessing.Process(
+            target=self.target,
+            args=(name, self.ready, self.stop_event),
+            kwargs=options,
+            name="emonitor-network",
+        )
+
+    def start(self, timeout=10.0):
+        # Returns once the shared memory block can be read
+        self.process.start()
+        deadline = time.perf_counter() + timeout
+
+        while not self.ready.wait(0.1):
+            if not self.process.is_alive():
+                raise RuntimeError(
+                    f"The network process exited with code {self.process.exitcode}"
+                )
+
+            if time.perf_counter() > deadline:
+                self.stop()
+                raise RuntimeError("The network process didn't start")
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        self.process.join(timeout)
+
+        if self.process.is_alive():
+            print("The network process didn't stop, terminating it")
+            self.process.terminate()
+            self.process.join()
+
+
+class SharedSample:
+    """
+    Shows the newest sample in the shared memory block name on monitor,
+    which has no socket of its own
+    """
+
+    def __init__(self, monitor, name):
+        self.monitor = monitor
+        self.reader = SharedStateReader(name)
+        self.count = 0
+
+    def read(self, dt):
+        # Copies the newest sample into the monitor if there is a new one;
+        # never blocks
+        # dt will not be used, but we need to give an extra input for pyglet
+        count = self.reader.count
+        if count == self.count:
+            return
+
+        self.count = count
+        m = self.monitor
+
+        (
+            m.last_receive_time,
+            m.target_tor,
+            m.low_lim_tor,
+            m.up_lim_tor,
+            m.match_tor,
+            m.targetF,
+            m.low_limF,
+            m.up_limF,
+            m.matchF,
+            state,
+            sounds,
+            stop,
+        ) = self.reader.latest().item()
+
+        # v1 packets have no state
+        if not math.isnan(state):
+            m.state = state
+
+        # The time the sample reached this process
+        m.last_decode_time = time.perf_counter()
+
+    def close(self):
+        self.reader.close()
@@ -0,0 +1,201 @@
+"""Per-stage frame profiling
+
+When the circle looks laggy, the FPS alone doesn't say where the time goes.
+With the profiler on, each stage of a frame is timed with
+time.perf_counter, and the p50 and p99 of the last WINDOW frames are shown
+above the FPS display:
+    receive:  reading and decoding packets, sounds included
+    sounds:   the sound trigger scan of each packet, part of receive
+    update:   bringing the scene up to date: the circles and lines, and
+              making the scene when its state first comes up
+    clear:    window.clear()
+    fps:      the FPS display
+    shapes:   the circles and lines batch
+    ring:     the ring batch
+    photo:    the photo blit
+    overlays: the latency overlay and this one
+    flip:     flipping the frame to the screen, waiting for vsync and the
+              GPU to finish what the draws submitted
+
+Draw calls only hand their work to the driver, so a slow GPU shows up in
+flip rather than in the stage that drew. Packets received on another
+thread or process are only timed as far as the window reading them.
+
+Nothing is timed while the profiler is off: EMonitorApp swaps in its
+timed on_draw, receive and flip only while it is on, so the usual ones
+don't even check whether to time. F8 turns it on and off, and F9 starts a
+cProfile capture of the window's thread; F9 again writes it to
+PROFILE_DIRECTORY, to look at with e.g.
+    python -m pstats profiles/profile_20240101_120000.prof
+"""
+
+import cProfile, os, time
+from weakref import WeakMethod
+
+import pyglet
+
+PROFILE_DIRECTORY = "profiles"
+
+# In the order they happen; the scenes' draw_stages use the draw ones
+STAGES = (
+    "receive",
+    "sounds",
+    "update",
+    "clear",
+    "fps",
+    "shapes",
+    "ring",
+    "photo",
+    "overlays",
+    "flip",
+)
+
+# Frames the percentiles are taken over
+WINDOW = 240
+
+TOGGLE_KEY = pyglet.window.key.F8
+CAPTURE_KEY = pyglet.window.key.F9
+
+
+def replace_handler(window, name, old, new):
+    # Puts new where old is in the window's handler stack, so handlers pushed
+    # since (e.g. a rig's FrameTimer) still run before it; pushing new would
+    # put it on top. pyglet 1.5 has no public way to do this, and keeps
+    # methods pushed as handlers as WeakMethods
+    for frame in window._event_stack:
+        handler = frame.get(name)
+        weak = isinstance(handler, WeakMethod)
+
+        if (handler() if weak else handler) == old:
+            frame[name] = WeakMethod(new) if weak else new
+            return
+
+
+class RollingTimes:
+    """
+    The last size durations in seconds, in a ring, for percentiles over
+    the recent frames only
+    """
+
+    def __init__(self, size=WINDOW):
+        self.times = [0.0] * size
+        self.size = size
+        self.index = 0
+        self.count = 0
+
+    def add(self, seconds):
+        self.times[self.index] = seconds
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+
+    def percentile(self, p):
+        # Returns the p-th percentile of the durations held, or None if
+        # nothing was added
+        n = min(self.count, self.size)
+        if n == 0:
+            return None
+
+        times = sorted(self.times[:n])
+        return times[min(int(p / 100 * n), n - 1)]
+
+
+class StageProfiler:
+    """
+    Keeps a RollingTimes per stage, and draws the ones timed so far in a
+    label that is only laid out again every update_period seconds, like
+    LatencyOverlay
+    """
+
+    update_period = 0.5
+
+    def __init__(self, x=10, y=50):
+        self.times = {stage: RollingTimes() for stage in STAGES}
+
+        # Grows up from above the FPS display
+        self.label = pyglet.text.Label(
+            "",
+            font_name="Courier New",
+            font_size=14,
+            bold=True,
+            color=(127, 127, 127, 200),
+            x=x,
+            y=y,
+            anchor_y="bottom",
+            multiline=True,
+            width=600,
+        )
+        self.last_update = 0.0
+
+        self.capture = None
+        self.capture_start = None
+
+    def lap(self, stage, start):
+        # Adds the time since start to stage, and returns now for the next
+        now = time.perf_counter()
+        self.times[stage].add(now - start)
+        return now
+
+    def timed(self, stage, function):
+        # Returns function, timing every call as stage
+        def timed_function(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.lap(stage, start)
+
+        return timed_function
+
+    def lines(self):
+        # One line per stage, in milliseconds
+        lines = []
+
+        for stage in STAGES:
+            times = self.times[stage]
+            if times.count == 0:
+                continue
+
+            lines.append(
+                f"{stage:8s} p50 {times.percentile(50) * 1000:6.2f}  "
+                f"p99 {times.percentile(99) * 1000:6.2f} ms"
+            )
+
+        return lines
+
+    def draw(self):
+        now = time.perf_counter()
+
+        if now - self.last_update >= self.update_period:
+            self.last_update = now
+
+            lines = self.lines()
+            if self.capture is not None:
+                lines.append(f"capturing {now - self.capture_start:.0f} s (F9)")
+
+            self.label.text = "\n".join(lines)
+
+        self.label.draw()
+
+    def start_capture(self):
+        self.capture = cProfile.Profile()
+        self.capture_start = time.perf_counter()
+        self.capture.enable()
+        print("Profiling, press F9 again to stop")
+
+    def stop_capture(self, directory=PROFILE_DIRECTORY):
+        # Writes the capture to a timestamped file, and returns its path
+        self.capture.disable()
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, time.strftime("profile_%Y%m%d_%H%M%S.prof"))
+        self.capture.dump_stats(path)
+        self.capture = None
+
+        print("Profile written to", path)
+        return path
+
+    def toggle_capture(self):
+        if self.capture is None:
+            self.start_capture()
+        else:
+            self.stop_capture()
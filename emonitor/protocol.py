@@ -0,0 +1,214 @@
+"""Packet layouts sent by the ACT4D Simulink model
+
+Every layout is compiled into a Schema (a struct.Struct plus where its
+fields are) once, so a packet is decoded with a single unpack_from call
+straight out of the receive buffer.
+
+Legacy packets have no header, and are told apart by their length:
+v1 (EMonitorPyglet.py):    8 doubles, 13 bools, stop byte (78 bytes)
+v2 (EMonitorPyglet_v2.py): 9 doubles (adds the state), 13 bools, stop
+                           byte (86 bytes)
+
+Described packets start with a HEADER saying what follows:
+    magic b"EMON", protocol version (uint8), number of doubles (uint8),
+    number of sound cues (uint16)
+then the doubles, one bool per sound cue and the stop byte, as above. The
+doubles are named by the version's entry in FIELDS; a newer model may send
+more doubles than are registered, which are decoded but not shown, and any
+number of sound cues.
+
+Either kind may be followed by the optional timing field: a uint32 sequence
+number and the sender's timestamp as a double (12 more bytes), used to
+measure latency (see emonitor.latency).
+"""
+
+import functools, struct
+
+# The doubles at the start of the packet for each protocol version. Add an
+# entry with register_version to name the doubles of a new version.
+FIELDS = {
+    1: (
+        "target_tor",
+        "low_lim_tor",
+        "up_lim_tor",
+        "match_tor",
+        "targetF",
+        "low_limF",
+        "up_limF",
+        "matchF",
+    ),
+}
+FIELDS[2] = FIELDS[1] + ("state",)
+
+# Number of doubles at the start of the packet for each protocol version
+N_DOUBLES = {version: len(fields) for version, fields in FIELDS.items()}
+
+# Number of sound cues in legacy packets
+LEGACY_SOUNDS = 13
+
+MAGIC = b"EMON"
+HEADER = struct.Struct("<4sBBH")
+
+# Sequence number and sender timestamp, after the stop byte
+TIMING_FORMAT = "Id"
+TIMING_SIZE = struct.calcsize("<" + TIMING_FORMAT)
+
+
+def register_version(version, fields):
+    """
+    Names the doubles sent by a protocol version. The first 8 must be the
+    v1 fields, and "state" is shown as the state if it is there
+    """
+    fields = tuple(fields)
+
+    if fields[:8] != FIELDS[1]:
+        raise ValueError("The first 8 fields must be the v1 fields")
+
+    FIELDS[version] = fields
+    N_DOUBLES[version] = len(fields)
+
+    # Schemas compiled before this may have the wrong names
+    schema.cache_clear()
+
+
+class Schema:
+    """
+    One compiled packet layout
+
+    struct unpacks the values from offset (past the header, if there is
+    one) as one flat tuple: the doubles, one bool per sound cue, the stop
+    byte, then the sequence number and sender timestamp if timed. The
+    *_index attributes say where each part is in that tuple; state_index
+    and timing_index are None if the layout doesn't have them.
+    """
+
+    def __init__(self, version, n_doubles, n_sounds, timed, described):
+        self.version = version
+        self.n_doubles = n_doubles
+        self.n_sounds = n_sounds
+        self.timed = timed
+        self.described = described
+
+        known = FIELDS.get(version, FIELDS[1])[:n_doubles]
+        self.fields = known + tuple(f"field{i}" for i in range(len(known), n_doubles))
+
+        self.state_index = None
+        if "state" in self.fields:
+            self.state_index = self.fields.index("state")
+
+        self.sound_index = n_doubles
+        self.stop_index = n_doubles + n_sounds
+        self.timing_index = self.stop_index + 1 if timed else None
+
+        fmt = "<%dd%d?B" % (n_doubles, n_sounds)
+        if timed:
+            fmt += TIMING_FORMAT
+
+        self.struct = struct.Struct(fmt)
+        self.offset = HEADER.size if described else 0
+        self.size = self.offset + self.struct.size
+
+    def header(self):
+        # The header to send in front of described packets of this layout
+        return HEADER.pack(MAGIC, self.version, self.n_doubles, self.n_sounds)
+
+    def __repr__(self):
+        return (
+            f"Schema(v{self.version}, {self.n_doubles} doubles, "
+            f"{self.n_sounds} sounds, {self.size} bytes"
+            f"{', timed' if self.timed else ''}"
+            f"{', described' if self.described else ''})"
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def schema(
+    version, n_sounds=LEGACY_SOUNDS, timed=False, described=False, n_doubles=None
+):
+    """
+    Returns the compiled Schema for a layout, compiling it the first time
+
+    n_doubles defaults to the number of registered fields of the version
+    """
+    if n_doubles is None:
+        n_doubles = N_DOUBLES[version]
+
+    return Schema(version, n_doubles, n_sounds, timed, described)
+
+
+def packet_layout(version, n_sounds=LEGACY_SOUNDS, timed=False):
+    """
+    Returns the struct.Struct of a legacy (headerless) layout
+
+    Unpacking gives the doubles, then one bool per sound cue, then the stop
+    trigger byte, as one flat tuple. If timed, the sequence number and sender
+    timestamp follow.
+    """
+    return schema(version, n_sounds, timed).struct
+
+
+class PacketDecoder:
+    """
+    Decodes packets of any layout into (schema, values)
+
+    Described packets are recognised by the magic at their start, and their
+    schema is compiled the first time each header is seen with a length
+    that matches it; only those are kept, so garbage starting with the magic
+    can't grow the cache. Anything else is
+    a legacy packet of every registered version (timed or not), picked by
+    its length.
+    """
+
+    def __init__(self, n_sounds=LEGACY_SOUNDS):
+        self.legacy = {}
+
+        for version in sorted(FIELDS):
+            for timed in (False, True):
+                s = schema(version, n_sounds, timed)
+                self.legacy.setdefault(s.size, s)
+
+        # (header, packet length) -> schema, for the ones that match
+        self.described = {}
+
+    def decode(self, data):
+        """
+        Returns (schema, values) for a packet, or None if it has no known
+        layout. data may be a memoryview of the receive buffer
+        """
+        if data[:4] == MAGIC:
+            key = (bytes(data[: HEADER.size]), len(data))
+            s = self.described.get(key)
+
+            if s is None:
+                s = self.compile(*key)
+                if s is not None:
+                    self.described[key] = s
+
+        else:
+            s = self.legacy.get(len(data))
+
+        if s is None:
+            return None
+
+        return s, s.struct.unpack_from(data, s.offset)
+
+    def compile(self, header, size):
+        # Returns the schema of a described packet, or None if its length
+        # doesn't match its header. Only a match is compiled, since schema()
+        # keeps everything it compiles
+        if len(header) < HEADER.size:
+            return None
+
+        magic, version, n_doubles, n_sounds = HEADER.unpack(header)
+
+        if n_doubles < 8:
+            return None
+
+        # The doubles, a byte per sound cue and the stop byte
+        untimed = HEADER.size + 8 * n_doubles + n_sounds + 1
+
+        for timed in (False, True):
+            if size == untimed + TIMING_SIZE * timed:
+                return schema(version, n_sounds, timed, True, n_doubles)
+
+        return None
@@ -0,0 +1,379 @@
+"""UDP receivers
+
+ReceiverThread blocks on the socket on its own thread, so packets are read
+and decoded as soon as they arrive instead of when the render loop gets
+around to them. The newest decoded sample is left in a LatestSample slot for
+the renderer.
+
+ReceivePoller reads the packets waiting on the socket each time it is called
+from the render loop's clock, at whatever frequency it is scheduled.
+
+MultiReceiver reads the sockets of several EMonitors on one thread, waiting
+on all of them with a single selector, for one process running many rigs.
+
+Both read packets with a recv function, which returns the packet's length
+and its receive time. recv_packet takes the time when Python reads the
+packet; recv_timestamped takes it from the kernel, which stamps each packet
+as it comes off the wire when the socket was opened with timestamps (Linux
+only), so the time doesn't depend on how long the packet waited to be read.
+"""
+
+import selectors, socket, struct, sys, threading, time
+
+# Linux's value, for Pythons that don't define it
+SO_TIMESTAMPNS = getattr(
+    socket, "SO_TIMESTAMPNS", 35 if sys.platform.startswith("linux") else None
+)
+
+# The struct timespec of a kernel timestamp: seconds and nanoseconds, as
+# native longs
+TIMESPEC = struct.Struct("@ll")
+TIMESTAMP_SPACE = socket.CMSG_SPACE(TIMESPEC.size) if SO_TIMESTAMPNS else 0
+
+
+def kernel_timestamps_supported():
+    return SO_TIMESTAMPNS is not None and hasattr(socket.socket, "recvmsg_into")
+
+
+def open_socket(ip, port, rcvbuf=None, reuse_address=False, timestamps=False):
+    """
+    Returns a nonblocking UDP socket bound to (ip, port)
+
+    rcvbuf asks for a kernel receive buffer of that many bytes, so a burst
+    of packets waits there instead of being dropped; the OS may give less
+    (on Linux, up to net.core.rmem_max). reuse_address lets another socket
+    bind the same port, e.g. a second EMonitor or a capture tool. With
+    timestamps the kernel stamps every packet for recv_timestamped.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    if reuse_address:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+
+        given = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        if given < rcvbuf:
+            print(f"Asked for a {rcvbuf} byte receive buffer, got {given}")
+
+    if timestamps:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+
+    sock.bind((ip, port))
+
+    # Makes the socket nonblocking
+    sock.setblocking(0)
+
+    return sock
+
+
+def recv_packet(sock, buffer):
+    # Reads one packet into buffer, and returns (nbytes, receive_time)
+    return sock.recv_into(buffer), time.perf_counter()
+
+
+def recv_timestamped(sock, buffer):
+    """
+    Reads one packet into buffer, and returns (nbytes, receive_time), with
+    the kernel's timestamp moved onto the time.perf_counter clock. Falls
+    back to the time it was read if the packet has no timestamp
+    """
+    nbytes, ancdata, flags, address = sock.recvmsg_into([buffer], TIMESTAMP_SPACE)
+    receive_time = time.perf_counter()
+
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+            seconds, nanoseconds = TIMESPEC.unpack_from(data)
+
+            # How long ago the packet arrived, by the wall clock the kernel
+            # stamps it with
+            age = time.time_ns() - (seconds * 1_000_000_000 + nanoseconds)
+            receive_time -= max(age, 0) / 1e9
+
+    return nbytes, receive_time
+
+
+class LatestSample:
+    """
+    Holds the newest (receive_time, packet, decode_time) sample from the
+    receiver thread
+
+    The writer swaps in a new tuple and the reader takes whichever tuple is
+    there. Both are a single reference assignment, which is atomic under the
+    GIL, so neither side takes a lock and the reader never sees half a sample.
+    """
+
+    __slots__ = ("sample",)
+
+    def __init__(self):
+        self.sample = None
+
+    def publish(self, sample):
+        self.sample = sample
+
+    def read(self):
+        return self.sample
+
+
+class ReceiverThread(threading.Thread):
+    """
+    Reads every packet from sock, decodes it and publishes it to slot
+
+    If record is given, it is called with (receive_time, packet, data) for
+    every valid packet before it is published
+
+    decode is called with a memoryview of the packet in the receive buffer,
+    and returns the decoded packet or None if it should be dropped.
+    Receive times are on the time.perf_counter clock, which is monotonic and
+    high resolution on every OS, and come from recv.
+    """
+
+    def __init__(
+        self,
+        sock,
+        decode,
+        slot,
+        record=None,
+        bufsize=1460,
+        timeout=0.1,
+        recv=recv_packet,
+    ):
+        super().__init__(name="emonitor-receiver", daemon=True)
+
+        self.sock = sock
+        self.decode = decode
+        self.slot = slot
+        self.record = record
+        self.recv = recv
+
+        # Every packet is received into the same buffer
+        self.buffer = bytearray(bufsize)
+        self.buffer_view = memoryview(self.buffer)
+
+        # The timeout only bounds how long stop() waits for the thread
+        self.timeout = timeout
+
+        self.running = True
+        self.packets = 0
+
+    def run(self):
+        self.sock.settimeout(self.timeout)
+
+        while self.running:
+            try:
+                nbytes, receive_time = self.recv(self.sock, self.buffer)
+
+            except socket.timeout:
+                continue
+
+            except OSError:
+                # The socket was closed underneath us
+                break
+
+            self.packets += 1
+
+            data = self.buffer_view[:nbytes]
+            packet = self.decode(data)
+
+            if packet is not None:
+                decode_time = time.perf_counter()
+
+                if self.record is not None:
+                    self.record(receive_time, packet, data)
+
+                self.slot.publish((receive_time, packet, decode_time))
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+
+class MultiReceiver(threading.Thread):
+    """
+    Reads the packets of every registered EMonitor on one thread, the way
+    ReceiverThread does for one, and publishes each EMonitor's newest
+    sample to its latest slot
+
+    Each EMonitor is read into its own buffer with its own recv function,
+    and its packets are recorded with its record_sample. packets and
+    invalid count the packets read and the ones dropped, per EMonitor.
+    """
+
+    def __init__(self, timeout=0.1):
+        super().__init__(name="emonitor-multi-receiver", daemon=True)
+
+        self.selector = selectors.DefaultSelector()
+
+        # The timeout only bounds how long stop() waits for the thread
+        self.timeout = timeout
+
+        self.monitors = []
+        self.packets = {}
+        self.invalid = {}
+
+        self.running = True
+
+    def register(self, monitor):
+        # Only before start(); the monitor's socket stays nonblocking
+        self.selector.register(monitor.sock, selectors.EVENT_READ, monitor)
+        self.monitors.append(monitor)
+        self.packets[monitor] = 0
+        self.invalid[monitor] = 0
+
+    def run(self):
+        select = self.selector.select
+        perf_counter = time.perf_counter
+
+        while self.running:
+            for key, events in select(self.timeout):
+                m = key.data
+                recv = m.recv
+                sock = m.sock
+                buffer = m.buffer
+                buffer_view = m.buffer_view
+                n = 0
+
+                while True:
+                    try:
+                        nbytes, receive_time = recv(sock, buffer)
+
+                    except BlockingIOError:
+                        break
+
+                    except OSError:
+                        # The socket was closed underneath us
+                        self.running = False
+                        break
+
+                    n += 1
+
+                    data = buffer_view[:nbytes]
+                    packet = m.decode_udp_package(data)
+
+                    if packet is None:
+                        self.invalid[m] += 1
+                        continue
+
+                    decode_time = perf_counter()
+                    m.record_sample(receive_time, packet, data)
+                    m.latest.publish((receive_time, packet, decode_time))
+
+                self.packets[m] += n
+
+    def stop(self):
+        self.running = False
+        self.join()
+        self.selector.close()
+
+
+class ReceivePoller:
+    """
+    Reads every packet waiting on monitor's nonblocking socket, for
+    scheduling on the pyglet clock in place of EMonitor.recieve_single_udp
+
+    By default a poll reads until the socket raises BlockingIOError, like
+    recieve_single_udp does, so every poll pays for one raised exception.
+    With readiness, a selector is asked with a zero timeout first, and the
+    socket is only read while it has a packet waiting.
+
+    polls, empty_polls and packets count the polls, the polls that found
+    nothing, and the packets read, to tune the poll frequency; fewer polls
+    use less CPU, but leave packets waiting longer before they are shown.
+    """
+
+    def __init__(self, monitor, readiness=False):
+        self.monitor = monitor
+        self.readiness = readiness
+
+        self.selector = None
+        if readiness:
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(monitor.sock, selectors.EVENT_READ)
+            self.poll = self.poll_ready
+        else:
+            self.poll = self.poll_drain
+
+        self.polls = 0
+        self.empty_polls = 0
+        self.packets = 0
+
+    def poll_drain(self, dt):
+        # dt will not be used, but we need to give an extra input for pyglet
+        m = self.monitor
+        recv = m.recv
+        sock = m.sock
+        buffer = m.buffer
+        buffer_view = m.buffer_view
+        record = m.record_udp_package
+        newest = None
+        n = 0
+
+        while True:
+            try:
+                nbytes, receive_time = recv(sock, buffer)
+
+            except BlockingIOError:
+                break
+
+            packet = record(buffer_view[:nbytes], receive_time)
+            if packet is not None:
+                newest = receive_time, packet
+            n += 1
+
+        # Every packet is recorded, but only the newest is shown
+        if newest is not None:
+            m.show_sample(*newest)
+
+        self._count(n)
+
+    def poll_ready(self, dt):
+        # dt will not be used, but we need to give an extra input for pyglet
+        m = self.monitor
+        recv = m.recv
+        sock = m.sock
+        buffer = m.buffer
+        buffer_view = m.buffer_view
+        record = m.record_udp_package
+        newest = None
+        select = self.selector.select
+        n = 0
+
+        while select(0):
+            try:
+                nbytes, receive_time = recv(sock, buffer)
+
+            except BlockingIOError:
+                # The OS can wake a selector for a packet it then drops,
+                # e.g. one with a bad checksum
+                break
+
+            packet = record(buffer_view[:nbytes], receive_time)
+            if packet is not None:
+                newest = receive_time, packet
+            n += 1
+
+        # Every packet is recorded, but only the newest is shown
+        if newest is not None:
+            m.show_sample(*newest)
+
+        self._count(n)
+
+    def _count(self, n):
+        self.polls += 1
+        self.packets += n
+
+        if n == 0:
+            self.empty_polls += 1
+
+    def report(self):
+        empty = 100 * self.empty_polls / max(self.polls, 1)
+        return (
+            f"{self.polls} polls, {self.empty_polls} empty ({empty:.0f}%), "
+            f"{self.packets} packets"
+        )
+
+    def close(self):
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
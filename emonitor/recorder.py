@@ -0,0 +1,221 @@
+"""Append-only session recorder
+
+Streams every received packet, both the decoded fields and the raw bytes,
+into a memory-mapped file, so there is a record of exactly what the subject
+saw and heard. Appending only writes into the mapping; a background thread
+flushes it to disk and grows the file in large chunks ahead of the writer.
+
+File layout (little endian):
+    header, HEADER_SIZE bytes, see HEADER below
+    records, one per packet: the emonitor.history.SAMPLE_DTYPE fields,
+    the packet's length, then its raw bytes, zero padded to packet_size
+
+The raw bytes are a whole packet of any layout emonitor.protocol decodes;
+packets longer than packet_size are cut short, though their decoded fields
+are complete. The header's protocol field is only the version the EMonitor
+was configured with, not the layout of the packets held; that is in each
+record's raw bytes. Use load_recording to read a file back.
+"""
+
+import mmap, os, struct, threading, time
+
+import numpy as np
+
+from emonitor.history import SAMPLE_DTYPE, sample_record
+
+MAGIC = b"EMONREC\x00"
+FORMAT_VERSION = 2
+
+# magic, format version, configured protocol version, n_sounds, packet size, record size,
+# wall clock time at the start, time.perf_counter() at the start, records
+HEADER = struct.Struct("<8sHHHHIddQ")
+HEADER_SIZE = 64
+
+# Byte offset of the record count in the header
+COUNT_OFFSET = HEADER.size - 8
+
+# The file grows by this many records at a time, about 10 minutes at 1 kHz
+CHUNK_RECORDS = 1 << 19
+
+# Room for the raw bytes of each packet: a described v2 packet with its
+# timing field and up to 35 sound cues
+RAW_SIZE = 128
+
+
+def record_dtype(packet_size):
+    return np.dtype(
+        SAMPLE_DTYPE.descr + [("length", "u2"), ("raw", "V%d" % packet_size)]
+    )
+
+
+class SessionRecorder:
+    """
+    Records decoded packets to path, for an EMonitor started with version
+
+    append() is called from the receive path and never touches the disk,
+    unless the background thread has fallen a whole chunk behind
+    """
+
+    def __init__(
+        self, path, version, n_sounds=13, flush_interval=0.5, packet_size=RAW_SIZE
+    ):
+        self.path = path
+        self.version = version
+        self.n_sounds = n_sounds
+        self.packet_size = packet_size
+
+        self.dtype = record_dtype(self.packet_size)
+
+        self.file = open(path, "w+b")
+        self.lock = threading.Lock()
+
+        self.count = 0
+        self.capacity = 0
+        self.mmap = None
+        self.records = None
+        self._grow()
+
+        HEADER.pack_into(
+            self.mmap,
+            0,
+            MAGIC,
+            FORMAT_VERSION,
+            version,
+            n_sounds,
+            self.packet_size,
+            self.dtype.itemsize,
+            time.time(),
+            time.perf_counter(),
+            0,
+        )
+
+        self.flush_interval = flush_interval
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(
+            target=self._flush_loop, name="emonitor-recorder", daemon=True
+        )
+        self.flusher.start()
+
+    def _grow(self):
+        # Maps a larger file. The old mapping is left to the garbage
+        # collector, since the writer may still be holding it; both map the
+        # same pages of the file, so writes through either land on disk
+        with self.lock:
+            capacity = self.capacity + CHUNK_RECORDS
+            size = HEADER_SIZE + capacity * self.dtype.itemsize
+
+            if os.name != "nt":
+                # Windows grows the file when it is mapped past the end
+                self.file.truncate(size)
+
+            new_mmap = mmap.mmap(self.file.fileno(), size)
+            records = np.frombuffer(
+                new_mmap, dtype=self.dtype, count=capacity, offset=HEADER_SIZE
+            )
+
+            old_mmap = self.mmap
+            self.mmap = new_mmap
+
+            # Swap the records before the capacity, so a writer that sees the
+            # new capacity also sees the new records
+            self.records = records
+            self.capacity = capacity
+
+        if old_mmap is not None:
+            old_mmap.flush()
+
+    def append(self, receive_time, schema, values, data):
+        """
+        Records a packet, decoded by schema into values; data is its raw
+        bytes
+        """
+        if self.count >= self.capacity:
+            # The flush thread should have grown the file well before this
+            self._grow()
+
+        self.records[self.count] = (
+            *sample_record(receive_time, schema, values),
+            len(data),
+            bytes(data[: self.packet_size]),
+        )
+        self.count += 1
+
+    def flush(self):
+        with self.lock:
+            struct.pack_into("<Q", self.mmap, COUNT_OFFSET, self.count)
+            self.mmap.flush()
+
+    def _flush_loop(self):
+        while not self.stopped.wait(self.flush_interval):
+            if self.capacity - self.count < CHUNK_RECORDS // 2:
+                self._grow()
+
+            self.flush()
+
+    def close(self):
+        """
+        Stops the flush thread, and trims the file to the records written
+        """
+        self.stopped.set()
+        self.flusher.join()
+
+        self.flush()
+
+        size = HEADER_SIZE + self.count * self.dtype.itemsize
+
+        # Drop our references to the mappings so the file can be truncated
+        self.records = None
+        self.mmap.close()
+        self.mmap = None
+
+        self.file.truncate(size)
+        self.file.close()
+
+
+def load_recording(path):
+    """
+    Returns (header, records) for a recording
+
+    header is a dict of the header fields, and records is a read only
+    structured array of the recorded packets
+    """
+    with open(path, "rb") as f:
+        fields = HEADER.unpack(f.read(HEADER.size))
+
+    (
+        magic,
+        format_version,
+        version,
+        n_sounds,
+        packet_size,
+        record_size,
+        start_time,
+        start_counter,
+        count,
+    ) = fields
+
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an EMonitor recording")
+
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported recording format {format_version}")
+
+    header = {
+        "format_version": format_version,
+        "protocol": version,
+        "n_sounds": n_sounds,
+        "packet_size": packet_size,
+        "record_size": record_size,
+        "start_time": start_time,
+        "start_counter": start_counter,
+        "count": count,
+    }
+
+    dtype = record_dtype(packet_size)
+
+    if count == 0:
+        return header, np.zeros(0, dtype=dtype)
+
+    records = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+    return header, records
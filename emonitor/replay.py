@@ -0,0 +1,345 @@
+"""Replays recorded or synthetic sessions through an EMonitor
+
+Packets are fed to EMonitor.unpack_udp_package at their recorded times, in
+real time, at a speed multiplier, or as fast as possible. Run headless, the
+per-frame logic of on_draw (the scene registry's state 0 photo mode) runs at
+a fixed frame rate, and the sound engine sees every packet's trigger edges,
+with silent scenes and sound cues that log when they are entered and
+played. So a decoding or rendering change can be checked and timed against
+real sessions without a Simulink rig.
+
+Run from the repository root, with no window:
+    python -m emonitor.replay recordings/session_20210701_120000.emrec
+    python -m emonitor.replay --synthetic 30 --version 2 --fast
+
+EMonitorPyglet.py and EMonitorPyglet_v2.py replay a recording in their
+window when REPLAY_FILE is set.
+"""
+
+import argparse, math, time
+
+from emonitor.monitor import EMonitor
+from emonitor.protocol import LEGACY_SOUNDS, schema
+from emonitor.recorder import load_recording
+from emonitor.scene import PhotoScene, state_registry
+
+
+def recording_packets(path):
+    """
+    Returns the packets of a session recording as a list of (time, bytes),
+    with the times in seconds from the first packet
+    """
+    header, records = load_recording(path)
+
+    if len(records) == 0:
+        return []
+
+    start = records["receive_time"][0]
+    times = (records["receive_time"] - start).tolist()
+
+    return [
+        (t, bytes(raw)[:length])
+        for t, raw, length in zip(times, records["raw"], records["length"].tolist())
+    ]
+
+
+def synthetic_packets(
+    version, seconds=10.0, rate=1000.0, n_sounds=LEGACY_SOUNDS, described=False
+):
+    """
+    Returns a made up session as a list of (time, bytes)
+
+    The packets are legacy ones, unless described is set or there aren't
+    LEGACY_SOUNDS sound cues, when they have a header
+
+    The produced torque and force follow slow sine waves around their
+    targets. Every 2 seconds the state steps through 0, 1 and 2 (version 2
+    only), a sound cue is triggered for the first 100 ms of the step and the
+    stop trigger is sent for the last 50 ms.
+    """
+    described = described or n_sounds != LEGACY_SOUNDS
+    layout = schema(version, n_sounds, described=described)
+    header = layout.header() if described else b""
+    packets = []
+
+    for k in range(int(seconds * rate)):
+        t = k / rate
+
+        match_tor = 5 + 1.5 * math.sin(math.pi * t)
+        matchF = 7 + 1.5 * math.sin(math.pi * t / 2)
+        doubles = [5, 4, 6, match_tor, 7, 6, 8, matchF]
+
+        step = int(t // 2)
+        into_step = t - 2 * step
+
+        if version == 2:
+            doubles.append(step % 3)
+
+        triggers = [False] * n_sounds
+        if into_step < 0.1:
+            triggers[step % n_sounds] = True
+
+        stop = 1 if into_step >= 1.95 else 0
+
+        packets.append((t, header + layout.struct.pack(*doubles, *triggers, stop)))
+
+    return packets
+
+
+class Replayer:
+    """
+    Feeds a list of (time, bytes) packets to monitor
+
+    Schedule tick with pyglet.clock.schedule to replay against the wall
+    clock in a window, or call deliver with the session time to drive the
+    replay some other way (see run_headless)
+    """
+
+    def __init__(self, monitor, packets, speed=1.0):
+        self.monitor = monitor
+        self.times = [t for t, _ in packets]
+        self.packets = [data for _, data in packets]
+        self.speed = speed
+
+        self.index = 0
+        self.start = None
+
+    @property
+    def done(self):
+        return self.index >= len(self.packets)
+
+    def deliver(self, session_time):
+        """
+        Gives the monitor every packet recorded up to session_time, and
+        returns how many there were
+        """
+        first = self.index
+        times = self.times
+        n = len(times)
+
+        while self.index < n and times[self.index] <= session_time:
+            self.monitor.unpack_udp_package(
+                self.packets[self.index], time.perf_counter()
+            )
+            self.index += 1
+
+        return self.index - first
+
+    def tick(self, dt):
+        # Delivers the packets that are due by the wall clock, times speed
+        # dt will not be used, but we need to give an extra input for pyglet
+        now = time.perf_counter()
+
+        if self.start is None:
+            self.start = now
+
+        self.deliver((now - self.start) * self.speed)
+
+
+class EventLog:
+    """What a headless replay would have shown and played, with times"""
+
+    def __init__(self):
+        self.time = 0.0
+        self.events = []
+
+    def add(self, kind, value):
+        self.events.append((self.time, kind, value))
+
+
+class SilentScene:
+    """
+    Stands in for a scene with no window, and logs when it is entered
+
+    Entering and exiting are passed on to scene, if given, for scenes whose
+    enter and exit hooks don't need a window
+    """
+
+    def __init__(self, name, log, scene=None):
+        self.name = name
+        self.log = log
+        self.scene = scene
+
+    def enter(self, m):
+        self.log.add("view", self.name)
+        if self.scene is not None:
+            self.scene.enter(m)
+
+    def exit(self, m):
+        if self.scene is not None:
+            self.scene.exit(m)
+
+    def update(self, m):
+        return False
+
+    def draw(self):
+        pass
+
+
+class SilentCue:
+    """
+    Stands in for the player of a sound cue, and logs when it is played and
+    stopped
+    """
+
+    def __init__(self, index, log):
+        self.index = index
+        self.log = log
+
+    def play(self):
+        self.log.add("play", self.index)
+
+    def stop(self):
+        self.log.add("stop", self.index)
+
+
+def run_headless(replayer, frame_rate=60.0, realtime=True, on_frame=None, n_cues=None):
+    """
+    Runs the replay to the end at frame_rate frames per second of session
+    time, with no window
+
+    Each frame delivers the packets that are due, which play the sounds on
+    their trigger edges, then switches scenes like on_draw, then calls
+    on_frame with the view if it is given. With realtime set, frames are
+    paced to the wall clock at the replayer's speed; otherwise they run as
+    fast as possible. There are n_cues silent sound cues, the monitor's
+    n_sounds by default. Sounds are logged at the time of the frame whose
+    packets triggered them.
+
+    Returns a dict summarising the run, including the EventLog events
+    """
+    monitor = replayer.monitor
+    log = EventLog()
+    if n_cues is None:
+        n_cues = monitor.n_sounds
+
+    # Played straight away rather than on a thread, so the log is in order
+    monitor.start_sounds([SilentCue(i, log) for i in range(n_cues)], threaded=False)
+
+    scenes = state_registry(
+        monitor.version,
+        lambda: SilentScene("normal", log),
+        lambda: SilentScene("photos", log, PhotoScene(0, 0)),
+        lambda: SilentScene("blank", log),
+        len(monitor.graphics) > 0,
+    )
+
+    period = 1.0 / frame_rate
+    frames = 0
+    views = {}
+
+    start = time.perf_counter()
+
+    while not replayer.done:
+        frames += 1
+        session_time = frames * period
+
+        if realtime:
+            delay = start + session_time / replayer.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        log.time = session_time
+        replayer.deliver(session_time)
+
+        view = scenes.switch(int(monitor.state), monitor).name
+        views[view] = views.get(view, 0) + 1
+
+        if on_frame is not None:
+            on_frame(view)
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        "packets": len(replayer.packets),
+        "frames": frames,
+        "session_seconds": frames * period,
+        "wall_seconds": elapsed,
+        "views": views,
+        "plays": sum(1 for e in log.events if e[1] == "play"),
+        "stops": sum(1 for e in log.events if e[1] == "stop"),
+        "events": log.events,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay an EMonitor session with no window"
+    )
+    parser.add_argument("recording", nargs="?", help="a .emrec session recording")
+    parser.add_argument(
+        "--synthetic",
+        type=float,
+        metavar="SECONDS",
+        help="replay a made up session of this length instead",
+    )
+    parser.add_argument(
+        "--version", type=int, default=2, help="protocol of a synthetic session"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=1000.0, help="packets/s of a synthetic session"
+    )
+    parser.add_argument(
+        "--sounds",
+        type=int,
+        default=LEGACY_SOUNDS,
+        help="sound cues of a synthetic session",
+    )
+    parser.add_argument(
+        "--described",
+        action="store_true",
+        help="give the synthetic packets a protocol header",
+    )
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--fast", action="store_true", help="run as fast as possible")
+    parser.add_argument("--frame-rate", type=float, default=60.0)
+    parser.add_argument(
+        "--photos",
+        type=int,
+        default=1,
+        help="number of stand-in photos for state 0 (0 shows the blank window)",
+    )
+    parser.add_argument(
+        "--events", action="store_true", help="print every view change and sound"
+    )
+    args = parser.parse_args()
+
+    if args.synthetic:
+        version = args.version
+        packets = synthetic_packets(
+            version, args.synthetic, args.rate, args.sounds, args.described
+        )
+
+    elif args.recording:
+        version = load_recording(args.recording)[0]["protocol"]
+        packets = recording_packets(args.recording)
+
+    else:
+        parser.error("give a recording or --synthetic")
+
+    monitor = EMonitor(port=None, version=version)
+    monitor.graphics = [f"photo {i}" for i in range(args.photos)]
+
+    replayer = Replayer(monitor, packets, args.speed)
+    result = run_headless(
+        replayer, args.frame_rate, realtime=not args.fast, n_cues=args.sounds
+    )
+
+    if args.events:
+        for t, kind, value in result["events"]:
+            print(f"{t:10.3f} {kind:5s} {value}")
+
+    print(
+        f"Replayed {result['packets']} v{version} packets in {result['frames']} frames"
+    )
+    print(
+        f"{result['session_seconds']:.2f} s of session in "
+        f"{result['wall_seconds']:.2f} s "
+        f"({result['packets'] / result['wall_seconds']:.0f} packets/s)"
+    )
+    print(f"Views: {result['views']}")
+    print(f"Sounds played: {result['plays']}, stopped: {result['stops']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Several rigs in one process
+
+Runs an EMonitor window for each rig, each listening on its own port, in
+one Python process. All the sockets are read by one MultiReceiver thread,
+and the sound cues and photos are loaded once and shared by every rig. Each
+rig gets its own screen, fullscreen, if there is one for every rig, and
+otherwise every rig gets a window.
+
+Only the first window waits for vsync when it flips. That paces the event
+loop at the refresh rate, and the others flip straight after it; if they
+all waited, each would only get a share of the refresh rate.
+
+At exit, each rig's packet rate and the time its frames took to draw are
+printed. From the repository root:
+    python -m emonitor.rigs --ports 5005 5006 --version 2
+"""
+
+import argparse, time
+
+import pyglet
+
+from emonitor.app import (
+    ETHERNET_ADAPTER,
+    RECEIVE_BUFFER,
+    EMonitorApp,
+    find_ethernet_ip,
+    load_sounds,
+)
+from emonitor.assets import StartupTimer
+from emonitor.latency import StreamingHistogram
+from emonitor.receiver import MultiReceiver
+
+
+class FrameTimer:
+    """
+    Keeps a StreamingHistogram of how long window takes to draw each frame,
+    from the start of on_draw until it is flipped
+
+    Hooks the window's flip the same way pyglet's FPSDisplay does, so it
+    must be made after the window's own on_draw handler is pushed
+    """
+
+    def __init__(self, window):
+        self.histogram = StreamingHistogram()
+        self.start = None
+
+        window.push_handlers(on_draw=self.on_draw)
+
+        self._window_flip = window.flip
+        window.flip = self._hook_flip
+
+    def on_draw(self):
+        self.start = time.perf_counter()
+
+    def _hook_flip(self):
+        if self.start is not None:
+            self.histogram.add(time.perf_counter() - self.start)
+            self.start = None
+
+        self._window_flip()
+
+
+class MultiRig:
+    """
+    An EMonitorApp for each of ports, sharing one receiver thread, one set
+    of sound cues and one photo library
+
+    screens gives the screen of each rig, and defaults to one screen each,
+    in order. The other arguments are passed on to every EMonitorApp.
+    """
+
+    def __init__(
+        self,
+        ports,
+        version=2,
+        ip=None,
+        screens=None,
+        interface=ETHERNET_ADAPTER,
+        rcvbuf=RECEIVE_BUFFER,
+        redraw_on_change=False,
+        record_session=False,
+        share_state=False,
+        track_latency=False,
+    ):
+        self.startup = StartupTimer()
+
+        if ip is None:
+            with self.startup.phase("network"):
+                ip = find_ethernet_ip(interface)
+
+        with self.startup.phase("sounds"):
+            sound_cues = load_sounds()
+
+        if screens is None:
+            screens = list(range(len(ports)))
+
+        # Fullscreen only if every rig has a screen to itself
+        n_screens = len(pyglet.canvas.get_display().get_screens())
+        fullscreen = len(set(screens)) == len(screens) and max(screens) < n_screens
+
+        self.apps = []
+        photos = None
+
+        for i, (port, screen) in enumerate(zip(ports, screens)):
+            with self.startup.phase(f"rig {port}"):
+                app = EMonitorApp(
+                    version=version,
+                    ip=ip,
+                    port=port,
+                    screen_index=screen if fullscreen else 0,
+                    record_session=record_session,
+                    share_state=share_state,
+                    track_latency=track_latency,
+                    redraw_on_change=redraw_on_change,
+                    rcvbuf=rcvbuf,
+                    sound_cues=sound_cues,
+                    photos=photos,
+                    fullscreen=fullscreen,
+                    vsync=i == 0,
+                )
+
+            app.window.set_caption(f"EMonitor {port}")
+
+            # The first rig lists the photos, and the rest use its library
+            photos = app.photos
+
+            self.apps.append(app)
+
+        self.receiver = MultiReceiver()
+        self.frame_timers = {}
+
+        for app in self.apps:
+            self.receiver.register(app.emonitor)
+            self.frame_timers[app] = FrameTimer(app.window)
+
+        print("Startup:", self.startup.report())
+
+    def run(self):
+        for app in self.apps:
+            app.start(receive=app.emonitor.read_latest_sample)
+
+        self.receiver.start()
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        pyglet.app.run()
+
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+
+        self.receiver.stop()
+
+        for app in self.apps:
+            print(f"Rig {app.port}:")
+            app.stop()
+
+        print(f"{len(self.apps)} rigs, {cpu:.2f} s of CPU in {elapsed:.2f} s")
+
+        for line in self.report():
+            print(line)
+
+    def report(self):
+        # One line per rig: its packet rate and frame times
+        lines = []
+
+        for app in self.apps:
+            m = app.emonitor
+            packets = self.receiver.packets[m]
+            h = self.frame_timers[app].histogram
+
+            # Over the time the packets were arriving, not the whole run
+            stats = m.stats
+            rate = 0.0
+            if stats.packets > 1 and stats.last_time > stats.first_time:
+                rate = (stats.packets - 1) / (stats.last_time - stats.first_time)
+
+            line = (
+                f"port {app.port}: {packets} packets ({rate:.1f}/s, "
+                f"{self.receiver.invalid[m]} invalid)"
+            )
+
+            if h.count:
+                line += (
+                    f", frames p50 {h.percentile(50) * 1000:.2f} ms "
+                    f"p99 {h.percentile(99) * 1000:.2f} ms ({h.count} frames)"
+                )
+
+            lines.append(line)
+
+        return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an EMonitor for each rig")
+    parser.add_argument(
+        "--ports", type=int, nargs="+", required=True, help="one port per rig"
+    )
+    parser.add_argument(
+        "--screens",
+        type=int,
+        nargs="+",
+        help="the screen of each rig (default: one each, in order)",
+    )
+    parser.add_argument(
+        "--version", type=int, default=2, help="ACT4D packet protocol, 1 or 2"
+    )
+    parser.add_argument(
+        "--ip", help="address to listen on (default: that of --interface)"
+    )
+    parser.add_argument("--interface", default=ETHERNET_ADAPTER)
+    parser.add_argument("--rcvbuf", type=int, default=RECEIVE_BUFFER)
+    parser.add_argument(
+        "--on-change",
+        action="store_true",
+        help="only redraw when the packets change what is shown",
+    )
+    parser.add_argument(
+        "--record", action="store_true", help="record each rig to recordings/"
+    )
+    parser.add_argument(
+        "--share",
+        action="store_true",
+        help="share each rig's samples through shared memory",
+    )
+    parser.add_argument(
+        "--latency", action="store_true", help="measure each rig's latency"
+    )
+    args = parser.parse_args(argv)
+
+    if args.screens is not None and len(args.screens) != len(args.ports):
+        parser.error("give one screen per port")
+
+    rigs = MultiRig(
+        args.ports,
+        version=args.version,
+        ip=args.ip,
+        screens=args.screens,
+        interface=args.interface,
+        rcvbuf=args.rcvbuf,
+        redraw_on_change=args.on_change,
+        record_session=args.record,
+        share_state=args.share,
+        track_latency=args.latency,
+    )
+    rigs.run()
+
+
+if __name__ == "__main__":
+    main()
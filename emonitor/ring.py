@@ -0,0 +1,154 @@
+"""Vectorized rasterizer for the moving torque ring
+
+Produces the same pixels as the original pure Python mid-point circle
+algorithm, but builds all of them with NumPy at once. The pixel offsets for a
+(radius, thickness) pair are kept in an LRU cache, so a radius that has been
+drawn before only costs a translation to the center.
+"""
+
+import functools
+
+import numpy as np
+import pyglet
+
+# Each cached ring holds roughly 17 * radius points for a thickness of 3, so
+# this bounds the cache to a few MB at the radii that the monitor draws
+RING_CACHE_SIZE = 128
+
+
+def circle_offsets(radius):
+    """
+    Pixel offsets from the center for a one pixel thick circle
+
+    Matches the points placed by the mid-point circle algorithm, as an (N, 2)
+    int32 array. Duplicate points of the original algorithm are dropped.
+    """
+    if radius <= 0:
+        return np.zeros((1, 2), dtype=np.int32)
+
+    # Only the first octant is computed, the rest are reflections of it. The
+    # mid-point algorithm keeps X while X * (X - 1) + Y^2 <= radius^2, so X
+    # for each Y is the largest integer that satisfies that
+    y = np.arange(1, int(radius * 0.7072) + 2, dtype=np.int64)
+    d = radius * radius - y * y
+    x = np.floor((1 + np.sqrt(1 + 4 * d)) / 2).astype(np.int64)
+
+    # Correct any float rounding
+    x -= x * (x - 1) > d
+    x += (x + 1) * x <= d
+
+    # The algorithm stops once X < Y, and after the step where X == Y
+    keep = x >= y
+    keep[1:] &= x[:-1] > y[:-1]
+    x = x[keep]
+    y = y[keep]
+
+    off = x != y
+    xo = x[off]
+    yo = y[off]
+
+    px = np.concatenate(([radius, -radius, 0, 0], x, -x, x, -x, yo, -yo, yo, -yo))
+    py = np.concatenate(([0, 0, radius, -radius], y, y, -y, -y, xo, xo, -xo, -xo))
+
+    return np.stack((px, py), axis=1).astype(np.int32)
+
+
+@functools.lru_cache(maxsize=RING_CACHE_SIZE)
+def ring_offsets(radius, thickness):
+    """
+    Pixel offsets from the center for a ring of the given thickness
+
+    The ring grows inwards from radius, like custom_draw_circle always has.
+    The returned array is cached and shared, so it is read only.
+    """
+    edges = min(thickness, radius)
+
+    if edges <= 0:
+        points = np.zeros((0, 2), dtype=np.int32)
+    else:
+        points = np.concatenate([circle_offsets(radius - t) for t in range(edges)])
+
+    points.setflags(write=False)
+    return points
+
+
+def custom_draw_circle(x_center, y_center, radius, color, thickness, batch):
+    """
+    Adds a ring of GL_POINTS to the batch, and returns its vertex list
+    """
+    offsets = ring_offsets(radius, thickness)
+    num_points = len(offsets)
+
+    if num_points == 0:
+        return None
+
+    vertex_list = batch.add(num_points, pyglet.gl.GL_POINTS, None, "v2i", "c3B")
+
+    vertices = np.ctypeslib.as_array(vertex_list.vertices)
+    np.add(offsets, (x_center, y_center), out=vertices.reshape(-1, 2))
+
+    colors = np.ctypeslib.as_array(vertex_list.colors)
+    colors.reshape(-1, 3)[:] = color
+
+    return vertex_list
+
+
+class Ring:
+    """
+    A ring that stays in the batch and is redrawn in place
+
+    Changing the radius reuses the same vertex list, and it only grows when a
+    ring has more points than any drawn before. Points past the end of the
+    current ring are stacked on its first pixel, so shrinking costs nothing.
+    """
+
+    def __init__(self, x, y, color, thickness, batch, group=None):
+        self.x = x
+        self.y = y
+        self.color = color
+        self.thickness = thickness
+        self.batch = batch
+        self.group = group
+
+        self.vertex_list = None
+        self._radius = 0
+
+    @property
+    def radius(self):
+        return self._radius
+
+    @radius.setter
+    def radius(self, value):
+        self._radius = value
+
+        offsets = ring_offsets(value, self.thickness)
+        num_points = len(offsets)
+
+        if num_points == 0:
+            if self.vertex_list is not None:
+                self.vertex_list.delete()
+                self.vertex_list = None
+            return
+
+        if self.vertex_list is None:
+            self.vertex_list = self.batch.add(
+                num_points, pyglet.gl.GL_POINTS, self.group, "v2i", "c3B"
+            )
+            self._fill_color()
+
+        elif self.vertex_list.get_size() < num_points:
+            self.vertex_list.resize(num_points)
+            self._fill_color()
+
+        vertices = np.ctypeslib.as_array(self.vertex_list.vertices).reshape(-1, 2)
+        np.add(offsets, (self.x, self.y), out=vertices[:num_points])
+        vertices[num_points:] = vertices[0]
+
+    def _fill_color(self):
+        colors = np.ctypeslib.as_array(self.vertex_list.colors)
+        colors.reshape(-1, 3)[:] = self.color
+
+    def delete(self):
+        if self.vertex_list is not None:
+            self.vertex_list.delete()
+            self.vertex_list = None
@@ -0,0 +1,353 @@
+"""Retained-mode scenes for the EMonitor window
+
+The normal protocol's circles and lines are built once, and are only moved,
+resized or recoloured when a decoded packet changes the values that they
+show. Nothing is allocated per frame, so the frame time doesn't grow over a
+session. State 0 shows a BlankScene or a PhotoScene instead.
+
+Every scene has update(m), which takes the values of the EMonitor m and
+returns True if anything changed, and draw(). enter(m) and exit(m) are
+called when the state switches to and away from the scene, which is kept
+for the next time, so nothing is rebuilt on a state change.
+
+A SceneRegistry says which scene each state shows. To add a trial screen,
+write a scene class and register a factory for its state; on_draw doesn't
+change.
+"""
+
+import pyglet
+
+from emonitor.photos import fit_size
+from emonitor.ring import Ring
+
+# Define RGB colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+BLUE = (0, 0, 175)
+RED = (255, 0, 0)
+
+
+class NormalProtocolScene:
+    """
+    Holds the target/limit circles, the force lines and the moving torque ring
+
+    Call update() with the EMonitor whenever a frame is about to be drawn; the
+    shapes are only touched if the monitor's values differ from the last call
+    """
+
+    def __init__(self, width, height, thickness=3, bg_color=WHITE):
+        self.width = width
+        self.height = height
+        self.thickness = thickness
+        self.bg_color = bg_color
+
+        self.center_x = width // 2
+        self.center_y = height // 2
+
+        self.batch = pyglet.graphics.Batch()
+
+        # The circle segment count is fixed when the shape is created, so
+        # size it for the largest circles we expect instead of the first
+        # radius that happens to be shown
+        segments = max(14, int(height / 1.25))
+
+        # One slot per circle, drawn largest first. Each slot is a coloured
+        # circle with a background circle on top of it, which leaves a ring.
+        # The ordered groups keep the draw order fixed, since the radii get
+        # shuffled between the slots as the limits change
+        self.circles = []
+        for i in range(3):
+            outer = pyglet.shapes.Circle(
+                self.center_x,
+                self.center_y,
+                0,
+                segments=segments,
+                color=BLACK,
+                batch=self.batch,
+                group=pyglet.graphics.OrderedGroup(2 * i),
+            )
+            inner = pyglet.shapes.Circle(
+                self.center_x,
+                self.center_y,
+                0,
+                segments=segments,
+                color=bg_color,
+                batch=self.batch,
+                group=pyglet.graphics.OrderedGroup(2 * i + 1),
+            )
+            self.circles.append((outer, inner))
+
+        line_group = pyglet.graphics.OrderedGroup(6)
+        self.lines = []
+        for color in (BLUE, BLUE, RED, BLACK):
+            self.lines.append(
+                pyglet.shapes.Line(
+                    0,
+                    self.center_y,
+                    width,
+                    self.center_y,
+                    width=thickness,
+                    color=color,
+                    batch=self.batch,
+                    group=line_group,
+                )
+            )
+
+        # The moving ring lives in its own batch so it is always drawn on top
+        self.ring_batch = pyglet.graphics.Batch()
+        self.ring = Ring(self.center_x, self.center_y, RED, thickness, self.ring_batch)
+
+        self.last_values = None
+
+    def update(self, m):
+        """
+        Moves the shapes to match the values held by the EMonitor m
+
+        Returns True if anything had to change
+        """
+        values = (
+            m.target_tor,
+            m.low_lim_tor,
+            m.up_lim_tor,
+            m.match_tor,
+            m.targetF,
+            m.low_limF,
+            m.up_limF,
+            m.matchF,
+        )
+
+        if values == self.last_values:
+            return False
+
+        self.last_values = values
+
+        center_y = self.center_y
+
+        # Define the radii of the circles
+        match_target_radius = int(self.height / 1.5)
+        targetF_line = center_y
+
+        if m.target_tor == 0:
+            m.target_tor = 1
+
+        if m.targetF == 0:
+            m.targetF = 1
+
+        lower_range_radius = int(match_target_radius * (m.low_lim_tor / m.target_tor))
+        upper_range_radius = int(match_target_radius * (m.up_lim_tor / m.target_tor))
+        representation_radius = int(match_target_radius * (m.match_tor / m.target_tor))
+
+        # Code to set the moving Y coordinates
+
+        lowF_line = targetF_line * (m.low_limF / m.targetF)
+        upF_line = targetF_line * (m.up_limF / m.targetF)
+
+        # The C# Code has matchY = center_y * ((2 - m.matchF) / m.targetF)
+        # i'm not sure why the 2.0 - is present though, so I deleted it
+        # This might have to be reintroduced sometime, or could be a side
+        # effect of the way that # does graphics
+        matchY = center_y * ((m.matchF) / m.targetF)
+
+        # Need to sort the radii, as the circles will draw on top of each other
+        radii = sorted(
+            [
+                (match_target_radius, BLACK),
+                (lower_range_radius, BLUE),
+                (upper_range_radius, BLUE),
+            ],
+            key=lambda t: t[0],
+            reverse=True,
+        )
+
+        for (outer, inner), (radius, color) in zip(self.circles, radii):
+            inner_radius = radius - (2 * self.thickness)
+
+            if outer.radius != radius:
+                outer.radius = radius
+
+            if outer.color != color:
+                outer.color = color
+
+            if inner_radius > 0:
+                if inner.radius != inner_radius:
+                    inner.radius = inner_radius
+
+                if not inner.visible:
+                    inner.visible = True
+
+            elif inner.visible:
+                inner.visible = False
+
+        for line, y in zip(self.lines, (lowF_line, upF_line, matchY, targetF_line)):
+            if line.y != y:
+                line.position = (0, y, self.width, y)
+
+        if representation_radius != self.ring.radius:
+            self.ring.radius = representation_radius
+
+        return True
+
+    def enter(self, m):
+        pass
+
+    def exit(self, m):
+        pass
+
+    def draw(self):
+        self.batch.draw()
+        self.ring_batch.draw()
+
+    def draw_stages(self):
+        # What draw() does, step by step, for the profiler
+        return (("shapes", self.batch.draw), ("ring", self.ring_batch.draw))
+
+
+class BlankScene:
+    """Shows nothing but the background; state 0 when there are no photos"""
+
+    def enter(self, m):
+        pass
+
+    def exit(self, m):
+        pass
+
+    def update(self, m):
+        return False
+
+    def draw(self):
+        pass
+
+    def draw_stages(self):
+        return ()
+
+
+class PhotoScene:
+    """
+    Shows the EMonitor's last_image, centered in the window, in state 0
+
+    A photo is picked at random on entering, and kept until the state
+    changes. Photos too big for the window are shrunk to fit; ones from a
+    PhotoLibrary already are. If none is ready yet the window stays blank,
+    and one is picked again on every update until it is
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        self.image = None
+        self.x = 0
+        self.y = 0
+        self.image_width = 0
+        self.image_height = 0
+
+    def enter(self, m):
+        m.choose_image()
+
+    def exit(self, m):
+        m.last_image = None
+
+    def update(self, m):
+        if m.last_image is None:
+            m.choose_image()
+
+        image = m.last_image
+
+        if image is self.image:
+            return False
+
+        self.image = image
+
+        if image is None:
+            return True
+
+        self.image_width, self.image_height = fit_size(
+            image.width, image.height, self.width, self.height
+        )
+
+        window_center_x = self.width // 2
+        window_center_y = self.height // 2
+
+        self.x = window_center_x - (self.image_width // 2)
+        self.y = window_center_y - (self.image_height // 2)
+
+        return True
+
+    def draw(self):
+        if self.image is not None:
+            self.image.blit(
+                self.x, self.y, width=self.image_width, height=self.image_height
+            )
+
+    def draw_stages(self):
+        return (("photo", self.draw),)
+
+
+class SceneRegistry:
+    """
+    Maps state values to the scenes that show them
+
+    Each state is registered with a factory, a function of no arguments that
+    makes its scene. A scene is only made the first time one of its states
+    comes up, and is then reused; states registered with the same factory
+    share one scene. States that aren't registered show the default.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self.factories = {}
+        self.scenes = {}
+        self.current = None
+
+    def register(self, state, factory):
+        self.factories[state] = factory
+
+    def scene_for(self, state):
+        factory = self.factories.get(state, self.default)
+        scene = self.scenes.get(factory)
+
+        if scene is None:
+            scene = self.scenes[factory] = factory()
+
+        return scene
+
+    def switch(self, state, m):
+        """
+        Returns the scene for state, calling exit on the last scene and enter
+        on this one if it changed
+        """
+        scene = self.scene_for(state)
+
+        if scene is not self.current:
+            if self.current is not None:
+                self.current.exit(m)
+
+            scene.enter(m)
+            self.current = scene
+
+        return scene
+
+    def clear(self, m):
+        # Drops every scene, e.g. when the window changes size
+        if self.current is not None:
+            self.current.exit(m)
+
+        self.current = None
+        self.scenes = {}
+
+
+def state_registry(version, normal, photos, blank, has_photos):
+    """
+    Returns the SceneRegistry of an EMonitor started with version, given
+    the factories of its scenes
+
+    Version 1 always shows the normal protocol. Version 2 shows a photo, or
+    a blank window if there are none, while the state is 0
+    """
+    registry = SceneRegistry(normal)
+
+    if version != 1:
+        # Note: emonitor.state is CurrState in act4D
+        registry.register(0, photos if has_photos else blank)
+
+    return registry
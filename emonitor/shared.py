@@ -0,0 +1,276 @@
+"""Live samples in shared memory
+
+A SharedStatePublisher writes every sample the EMonitor receives into a
+multiprocessing.shared_memory block, so other programs on the same PC (an
+online analysis, a logging script) can follow the stream without binding
+the port or opening any socket. A SharedStateReader in another process
+reads the newest sample, or the ones since it last looked, straight out of
+the block.
+
+The block is a header of HEADER_WORDS uint64s, then a ring of capacity
+emonitor.history.SAMPLE_DTYPE rows:
+    magic, capacity, row size, count (samples ever written), the
+    publisher's process id, unused...
+The single writer fills the row at count % capacity and only then advances
+count, like SampleHistory, so a reader that takes count first never sees a
+half written row. A reader that falls a full capacity behind may see rows
+being overwritten while it copies them; those are detected by reading
+count again afterwards, and dropped. This relies on the stores becoming
+visible in order, as they do on x86.
+
+Readers only ever read, so any number of them can follow one EMonitor
+without adding anything to its receive path.
+"""
+
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from emonitor.history import DEFAULT_CAPACITY, SAMPLE_DTYPE
+
+MAGIC = int.from_bytes(b"EMONSHM1", "little")
+
+HEADER_WORDS = 8
+HEADER_SIZE = HEADER_WORDS * 8
+
+# Indices into the header
+CAPACITY = 1
+ITEMSIZE = 2
+COUNT = 3
+PID = 4
+
+
+def default_name(port):
+    # The block an EMonitor listening on port publishes to by default
+    return f"emonitor_{port}"
+
+
+def attach(name):
+    """
+    Opens an existing block without taking ownership of it, so it is left
+    for its publisher to remove when this process exits
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+
+    except TypeError:
+        # Before Python 3.13, attaching registers the block with the
+        # resource tracker, which unlinks it when this process exits. It
+        # can't be unregistered afterwards either, since processes started
+        # by fork share the publisher's tracker, so it is never registered
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
+def process_running(pid):
+    # Whether the process pid is still alive
+    if os.name == "nt":
+        # Windows removes a block once no process has it open, so any that
+        # is still there is in use
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Alive, but someone else's
+        return True
+
+    return True
+
+
+class SharedStatePublisher:
+    """
+    Creates the block name and writes samples into it
+
+    Call close() to remove the block; readers still attached keep their
+    mapping until they close it. A block of the same name is only replaced
+    if the publisher that made it has exited; FileExistsError is raised if
+    it is still running.
+    """
+
+    def __init__(self, name, capacity=DEFAULT_CAPACITY):
+        self.name = name
+        self.capacity = capacity
+
+        size = HEADER_SIZE + capacity * SAMPLE_DTYPE.itemsize
+
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        except FileExistsError:
+            # Left behind by an EMonitor that didn't exit cleanly, or in use
+            # by one that is still running
+            self.remove_stale(name)
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        self.header = self.shm.buf[:HEADER_SIZE].cast("Q")
+        self.samples = np.ndarray(
+            capacity, dtype=SAMPLE_DTYPE, buffer=self.shm.buf, offset=HEADER_SIZE
+        )
+
+        self.count = 0
+
+        self.header[CAPACITY] = capacity
+        self.header[ITEMSIZE] = SAMPLE_DTYPE.itemsize
+        self.header[COUNT] = 0
+        self.header[PID] = os.getpid()
+
+        # Written last, so a reader never sees a half made header
+        self.header[0] = MAGIC
+
+    @staticmethod
+    def remove_stale(name):
+        # Unlinks the block name if its publisher has exited, and raises
+        # FileExistsError if it hasn't or the block isn't one of ours
+        block = attach(name)
+        try:
+            header = block.buf[:HEADER_SIZE].cast("Q")
+            magic, pid = header[0], header[PID]
+            header.release()
+        finally:
+            block.close()
+
+        if magic != MAGIC:
+            raise FileExistsError(
+                f"Shared memory block {name} exists and isn't an EMonitor's"
+            )
+
+        if process_running(pid):
+            raise FileExistsError(
+                f"Shared memory block {name} is in use by process {pid}; is "
+                f"another EMonitor publishing on the same port?"
+            )
+
+        # Opened again to unlink it, so the resource tracker's bookkeeping
+        # stays balanced before Python 3.13
+        stale = shared_memory.SharedMemory(name)
+        stale.close()
+        stale.unlink()
+
+    def publish(self, row):
+        # Writes one SAMPLE_DTYPE row, e.g. as returned by
+        # SampleHistory.append
+        self.samples[self.count % self.capacity] = row
+        self.count += 1
+        self.header[COUNT] = self.count
+
+    def close(self):
+        if self.shm is None:
+            return
+
+        # The views have to go before the block can be closed
+        self.header.release()
+        self.header = None
+        self.samples = None
+
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class SharedStateReader:
+    """
+    Follows the samples published to the block name
+
+    latest() returns the newest sample and recent(n) the last n, and
+    read_new() returns every sample since the last call to it, counting any
+    that were overwritten before it got to them in dropped. Everything
+    returned is a copy, which stays valid however far the publisher moves
+    on.
+    """
+
+    def __init__(self, name):
+        self.shm = attach(name)
+
+        self.header = self.shm.buf[:HEADER_SIZE].cast("Q")
+
+        if self.header[0] != MAGIC:
+            raise ValueError(f"{name} isn't an EMonitor shared memory block")
+
+        if self.header[ITEMSIZE] != SAMPLE_DTYPE.itemsize:
+            raise ValueError(f"{name} was written by another EMonitor version")
+
+        self.capacity = self.header[CAPACITY]
+        self.samples = np.ndarray(
+            self.capacity,
+            dtype=SAMPLE_DTYPE,
+            buffer=self.shm.buf,
+            offset=HEADER_SIZE,
+        )
+
+        # read_new() starts from the samples published after this
+        self.read_count = self.header[COUNT]
+        self.dropped = 0
+
+    @property
+    def count(self):
+        # Samples published so far
+        return self.header[COUNT]
+
+    def latest(self):
+        # The newest sample as a NumPy record, or None if there is none yet
+        count = self.header[COUNT]
+        if count == 0:
+            return None
+
+        return self.samples[(count - 1) % self.capacity].copy()
+
+    def recent(self, n):
+        # The last n samples (fewer if fewer were published), oldest first
+        return self._copy(max(self.header[COUNT] - n, 0), self.header[COUNT])
+
+    def read_new(self):
+        """
+        Returns the samples published since the last call, oldest first. If
+        more than a capacity were published since, only the newest are
+        returned
+        """
+        end = self.header[COUNT]
+        rows = self._copy(self.read_count, end)
+
+        self.dropped += end - self.read_count - len(rows)
+        self.read_count = end
+
+        return rows
+
+    def _copy(self, start, end):
+        # Copies samples start to end (counts, not indices), minus any that
+        # the publisher overwrote before or while they were copied
+        capacity = self.capacity
+        start = max(start, end - capacity)
+
+        first = start % capacity
+        n = end - start
+
+        if first + n <= capacity:
+            rows = self.samples[first : first + n].copy()
+        else:
+            rows = np.concatenate(
+                (self.samples[first:], self.samples[: first + n - capacity])
+            )
+
+        # Rows older than a capacity before the count now may have been
+        # overwritten while they were copied
+        overwritten = self.header[COUNT] - capacity - start
+        if overwritten > 0:
+            rows = rows[overwritten:]
+
+        return rows
+
+    def close(self):
+        if self.shm is None:
+            return
+
+        self.header.release()
+        self.header = None
+        self.samples = None
+
+        self.shm.close()
+        self.shm = None
@@ -0,0 +1,165 @@
+"""Sound cues
+
+The SoundEngine watches the sound trigger bits of every decoded packet, not
+just the ones that get drawn, and plays a cue when its bit goes from low to
+high. The stop trigger stops every cue played since the last stop, also on
+its rising edge. Each cue has one player made at startup, so nothing grows
+over a session, and by default the players are started on the engine's own
+thread, so a cue's timing doesn't depend on the frame rate.
+"""
+
+import queue, threading, time
+
+import pyglet
+
+from emonitor.latency import StreamingHistogram
+
+# Queued in place of a cue index to stop the cues
+STOP = -1
+
+
+class CuePlayer:
+    """
+    The pyglet Player of one sound cue, which plays it from the start each
+    time and can be played again once it has finished
+
+    pyglet's Player only touches the clock when playing here to unschedule
+    video updates, which is safe from another thread
+    """
+
+    def __init__(self, source):
+        self.player = pyglet.media.Player()
+        self.player.queue(source)
+
+        # Keep the source queued when it ends, instead of moving on to the
+        # (empty) rest of the playlist
+        self.player.push_handlers(on_eos=self.on_eos)
+
+    def on_eos(self):
+        return pyglet.event.EVENT_HANDLED
+
+    def play(self):
+        player = self.player
+
+        if player.playing:
+            player.pause()
+
+        player.seek(0)
+        player.play()
+
+    def stop(self):
+        self.player.pause()
+
+
+class SoundEngine:
+    """
+    Plays players[i] on each rising edge of sound trigger i
+
+    Call on_packet for every decoded packet. With threaded, play() and
+    stop() are called on the engine's thread, otherwise straight away.
+    latency holds the time from receiving the packet with the edge to
+    play() returning.
+    """
+
+    def __init__(self, players, threaded=True):
+        self.players = players
+        self.n_cues = len(players)
+
+        # Trigger bits and stop trigger of the last packet
+        self.triggers = (False,) * self.n_cues
+        self.stopping = False
+
+        # Cues played since the last stop; only used where they are played
+        self.active = set()
+
+        # Plays and stops requested, so far
+        self.events = 0
+
+        self.plays = 0
+        self.stops = 0
+        self.latency = StreamingHistogram()
+
+        self.requests = None
+        self.thread = None
+
+        if threaded:
+            self.requests = queue.SimpleQueue()
+            self.thread = threading.Thread(
+                target=self._run, name="emonitor-sound", daemon=True
+            )
+            self.thread.start()
+
+    def on_packet(self, receive_time, triggers, stop):
+        """
+        Takes the sound trigger bits and stop trigger of one packet, and
+        requests a play for every trigger that has just gone high and a stop
+        if the stop trigger has. Returns True if anything was requested
+        """
+        if triggers == self.triggers and bool(stop) == self.stopping:
+            return False
+
+        events = self.events
+        last = self.triggers
+
+        for i in range(min(len(triggers), self.n_cues)):
+            # Triggers past the last cue are ignored
+            if triggers[i] and not (i < len(last) and last[i]):
+                self._request(i, receive_time)
+
+        self.triggers = triggers
+
+        if stop and not self.stopping:
+            self._request(STOP, receive_time)
+
+        self.stopping = bool(stop)
+
+        return self.events != events
+
+    def _request(self, cue, receive_time):
+        self.events += 1
+
+        if self.requests is not None:
+            self.requests.put((cue, receive_time))
+        else:
+            self._perform(cue, receive_time)
+
+    def _perform(self, cue, receive_time):
+        if cue == STOP:
+            for i in self.active:
+                self.players[i].stop()
+
+            self.active.clear()
+            self.stops += 1
+            return
+
+        self.players[cue].play()
+        self.latency.add(time.perf_counter() - receive_time)
+
+        self.active.add(cue)
+        self.plays += 1
+
+    def _run(self):
+        while True:
+            request = self.requests.get()
+
+            if request is None:
+                break
+
+            self._perform(*request)
+
+    def close(self):
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def report(self):
+        line = f"{self.plays} plays, {self.stops} stops"
+
+        if self.latency.count:
+            line += (
+                f", trigger to play p50 {self.latency.percentile(50) * 1000:.2f} ms"
+                f" p99 {self.latency.percentile(99) * 1000:.2f} ms"
+            )
+
+        return line
@@ -0,0 +1,265 @@
+"""Statistics of the packet stream
+
+A StreamStats follows every packet the EMonitor receives: how many arrive a
+second, the gaps between them (a fixed log-spaced histogram, so jitter shows
+as the spread between its p50 and p99), packets with no known layout, and,
+for packets carrying the optional sequence number, how many were dropped,
+how many arrived late (reordered) and how many were duplicates. It keeps a
+fixed handful of numbers, so it can run for a whole session. Adding a packet is
+written out in one function, with no calls but an int and a bit_length,
+since it runs for every packet; the rate is only worked out when it is
+read.
+
+Drops are counted like RTP does (RFC 3550), as the sequence numbers
+skipped so far, but only a packet that fills one of the last MAX_MISORDER
+of them makes up for it by arriving late; any other packet behind the
+expected one is a duplicate, and doesn't hide a drop. Only the numbers
+skipped are kept, so a packet in order costs one comparison. A sequence number that jumps by
+more than MAX_DROPOUT, or back by more than MAX_MISORDER, is taken as the
+sender restarting once the next packet follows on from it, and counting
+carries on from there; until then it is ignored, so one corrupt packet
+can't throw the counts off.
+
+The signal counts as lost once no packet has arrived for the deadline
+(SIGNAL_DEADLINE in emonitor.app); see signal_lost.
+"""
+
+import math
+
+# Gaps are binned in 2 ** GAP_SUB_BITS equal steps to a doubling (at most
+# 6% wide), from 2 ** GAP_LOW_OCTAVE s (1 us) to 2 ** GAP_HIGH_OCTAVE s
+# (16 s). A gap is counted in units of GAP_SCALE, in which a gap in the
+# lowest octave has GAP_SUB_BITS + 1 bits, so the bit length of the count
+# gives its octave and the bits after the first its step
+GAP_SUB_BITS = 4
+GAP_BINS_PER_OCTAVE = 1 << GAP_SUB_BITS
+GAP_LOW_OCTAVE = -20
+GAP_HIGH_OCTAVE = 4
+GAP_BINS = (GAP_HIGH_OCTAVE - GAP_LOW_OCTAVE) * GAP_BINS_PER_OCTAVE
+GAP_SCALE = 2.0 ** (GAP_SUB_BITS - GAP_LOW_OCTAVE)
+
+SEQUENCE_MODULUS = 1 << 32
+
+# The largest gap in the sequence numbers counted as drops, and the furthest
+# back a sequence number is counted as late
+MAX_DROPOUT = 3000
+MAX_MISORDER = 100
+
+
+def signal_lost(last_receive_time, now, deadline):
+    """
+    Returns True if the last packet arrived more than deadline seconds before
+    now. Before the first packet there is no signal to lose
+    """
+    return last_receive_time is not None and now - last_receive_time > deadline
+
+
+class StreamStats:
+    """
+    Call add() for every valid packet and count a packet with no known
+    layout in malformed; both only from the thread receiving packets.
+    Everything else may be read from any thread
+    """
+
+    def __init__(self, rate_period=1.0):
+        self.packets = 0
+        self.malformed = 0
+        self.last_malformed_length = None
+
+        # Gaps between packets, of which there are packets - 1; the first
+        # and last bins also take everything below and above
+        self.gap_bins = [0] * GAP_BINS
+        self.max_gap = 0.0
+
+        self.first_time = None
+        self.last_time = None
+
+        # Packets/s over the last full rate_period (or longer, if it isn't
+        # read that often), worked out by current_rate
+        self.rate_period = rate_period
+        self.rate = 0.0
+        self.rate_start = None
+        self.rate_packets = 0
+
+        # Sequence numbers expected but not (yet) received: how many, and
+        # those of them less than MAX_MISORDER behind the newest
+        self.next_sequence = None
+        self.probation = None
+        self.missing = 0
+        self.skipped = set()
+        self.late = 0
+        self.duplicates = 0
+        self.restarts = 0
+
+    def add(self, receive_time, sequence=None):
+        last = self.last_time
+        self.last_time = receive_time
+        self.packets += 1
+
+        if last is None:
+            self.first_time = self.rate_start = receive_time
+        else:
+            gap = receive_time - last
+            q = int(gap * GAP_SCALE)
+
+            if q >= GAP_BINS_PER_OCTAVE:
+                n = q.bit_length() - GAP_SUB_BITS - 1
+                i = (n << GAP_SUB_BITS) + (q >> n) - GAP_BINS_PER_OCTAVE
+                if i >= GAP_BINS:
+                    i = GAP_BINS - 1
+            else:
+                # Below the lowest octave, or negative
+                i = 0
+
+            self.gap_bins[i] += 1
+
+            if gap > self.max_gap:
+                self.max_gap = gap
+
+        if sequence is None:
+            return
+
+        next_sequence = self.next_sequence
+
+        if sequence == next_sequence:
+            self.next_sequence = sequence + 1
+            return
+
+        if next_sequence is None:
+            self.next_sequence = (sequence + 1) % SEQUENCE_MODULUS
+            return
+
+        # How far ahead of the expected sequence number this one is, modulo
+        # the uint32 wrapping around
+        d = (sequence - next_sequence) % SEQUENCE_MODULUS
+
+        if d < MAX_DROPOUT:
+            # In order, after d dropped packets
+            self.missing += d
+            self.skip(next_sequence, d, sequence)
+
+        elif d >= SEQUENCE_MODULUS - MAX_MISORDER:
+            # Behind, so the expected sequence number stays: late if it was
+            # skipped, and otherwise a repeat of one already received
+            if sequence in self.skipped:
+                self.skipped.remove(sequence)
+                self.missing -= 1
+                self.late += 1
+            else:
+                self.duplicates += 1
+            return
+
+        elif sequence != self.probation:
+            # A jump; only believed if the next packet follows on from it
+            self.probation = (sequence + 1) % SEQUENCE_MODULUS
+            return
+
+        else:
+            self.restarts += 1
+            self.skipped.clear()
+
+        self.next_sequence = (sequence + 1) % SEQUENCE_MODULUS
+
+    def skip(self, first, n, sequence):
+        # Keeps the n sequence numbers from first that were skipped to get to
+        # sequence, as far as they could still arrive late, and forgets the
+        # ones that no longer could
+        skipped = self.skipped
+
+        for k in range(max(n - MAX_MISORDER, 0), n):
+            skipped.add((first + k) % SEQUENCE_MODULUS)
+
+        for old in [
+            s for s in skipped if (sequence - s) % SEQUENCE_MODULUS > MAX_MISORDER
+        ]:
+            skipped.remove(old)
+
+    def gap_percentile(self, p):
+        # Returns the upper edge of the bin holding the p-th percentile gap,
+        # or None if there are no gaps yet, like StreamingHistogram
+        gaps = self.packets - 1
+        if gaps <= 0:
+            return None
+
+        rank = p / 100 * gaps
+        seen = 0
+
+        for i, n in enumerate(self.gap_bins):
+            seen += n
+            if seen >= rank and n:
+                octave, step = divmod(i, GAP_BINS_PER_OCTAVE)
+                edge = 2.0 ** (GAP_LOW_OCTAVE + octave) * (
+                    1 + (step + 1) / GAP_BINS_PER_OCTAVE
+                )
+                return min(edge, self.max_gap)
+
+        return self.max_gap
+
+    @property
+    def dropped(self):
+        return self.missing
+
+    def since_last(self, now):
+        # Seconds since the last packet, or None if there hasn't been one
+        if self.last_time is None:
+            return None
+        return now - self.last_time
+
+    def current_rate(self, now):
+        # Packets/s, or 0 once the packets have stopped for a rate_period.
+        # Worked out again once a rate_period has gone by since the last time
+        since = self.since_last(now)
+        if since is None or since > self.rate_period:
+            return 0.0
+
+        if now - self.rate_start >= self.rate_period:
+            packets = self.packets
+            self.rate = (packets - self.rate_packets) / (now - self.rate_start)
+            self.rate_start = now
+            self.rate_packets = packets
+
+        return self.rate
+
+    def summary(self, now):
+        # One line for the mirror window
+        line = (
+            f"{self.current_rate(now):.0f} packets/s, {self.dropped} dropped, "
+            f"{self.late} late, {self.duplicates} duplicates, "
+            f"{self.malformed} malformed"
+        )
+
+        if self.packets > 1:
+            line += f", gap p99 {self.gap_percentile(99) * 1000:.2f} ms"
+
+        return line
+
+    def report(self):
+        # One line for the end of the session
+        if self.packets == 0:
+            return f"no packets, {self.malformed} malformed"
+
+        elapsed = self.last_time - self.first_time
+        rate = (self.packets - 1) / elapsed if elapsed > 0 else math.nan
+
+        line = f"{self.packets} packets ({rate:.1f}/s)"
+
+        if self.packets > 1:
+            line += (
+                f", gap p50 {self.gap_percentile(50) * 1000:.3f} ms "
+                f"p99 {self.gap_percentile(99) * 1000:.3f} ms "
+                f"max {self.max_gap * 1000:.1f} ms"
+            )
+
+        if self.next_sequence is not None:
+            line += (
+                f", {self.dropped} dropped, {self.late} late, "
+                f"{self.duplicates} duplicates"
+            )
+            if self.restarts:
+                line += f", {self.restarts} sender restarts"
+
+        line += f", {self.malformed} malformed"
+        if self.last_malformed_length is not None:
+            line += f" (last {self.last_malformed_length} bytes)"
+
+        return line